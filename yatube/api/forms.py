@@ -0,0 +1,11 @@
+from django import forms
+
+from posts.forms import PostForm
+from posts.models import Group
+
+
+class ApiPostForm(PostForm):
+    """Форма поста для API: группа задаётся слагом, а не id."""
+    group = forms.ModelChoiceField(
+        Group.objects.all(), to_field_name='slug', required=False
+    )
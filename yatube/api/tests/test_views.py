@@ -0,0 +1,187 @@
+import json
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, text=f'Пост {i}', group=cls.group
+            )
+            for i in range(12)
+        ]
+        cls.post = cls.posts[-1]
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        cache.clear()
+
+    def send_json(self, client, method, url, data):
+        return getattr(client, method)(
+            url, json.dumps(data), content_type='application/json'
+        )
+
+    def test_posts_are_paged_by_cursor(self):
+        url = reverse('api:posts')
+        first = self.guest_client.get(url, {'group': self.group.slug}).json()
+        self.assertEqual(
+            [post['id'] for post in first['results']],
+            [post.pk for post in self.posts[:1:-1]],
+        )
+        self.assertEqual(first['results'][0], {
+            'id': self.post.pk,
+            'text': self.post.text,
+            'pub_date': self.post.pub_date.isoformat(),
+            'author': 'auth',
+            'group': 'test-slug',
+            'image': None,
+        })
+        second = self.guest_client.get(
+            url, {'cursor': first['next_cursor']}
+        ).json()
+        self.assertEqual(
+            [post['id'] for post in second['results']],
+            [post.pk for post in self.posts[1::-1]],
+        )
+        self.assertIsNone(second['next_cursor'])
+
+    def test_fields_trim_payload(self):
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'id,author'}
+        )
+        self.assertEqual(
+            response.json()['results'][0],
+            {'id': self.post.pk, 'author': 'auth'},
+        )
+        response = self.guest_client.get(
+            reverse('api:posts'), {'fields': 'id,password'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_conditional_get(self):
+        url = reverse('api:posts')
+        response = self.guest_client.get(url)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        self.assertEqual(
+            last_modified[:16], self.post.pub_date.strftime('%a, %d %b %Y')
+        )
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        response = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        # Правка поста меняет ETag, хотя дата публикации та же
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['results'][0]['text'], 'Новый текст')
+
+    def test_post_write_methods(self):
+        response = self.send_json(
+            self.author_client, 'post', reverse('api:posts'),
+            {'text': 'Из приложения', 'group': self.group.slug},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        post = Post.objects.get(pk=response.json()['id'])
+        self.assertEqual(post.group, self.group)
+        url = reverse('api:post', kwargs={'post_id': post.pk})
+        for client, status in (
+            (self.guest_client, HTTPStatus.UNAUTHORIZED),
+            (self.reader_client, HTTPStatus.FORBIDDEN),
+        ):
+            with self.subTest(status=status):
+                response = self.send_json(
+                    client, 'patch', url, {'text': 'Чужая правка'}
+                )
+                self.assertEqual(response.status_code, status)
+        response = self.send_json(
+            self.author_client, 'patch', url, {'group': None}
+        )
+        self.assertEqual(response.json()['group'], None)
+        self.assertEqual(response.json()['text'], 'Из приложения')
+        response = self.send_json(
+            self.author_client, 'patch', url, {'text': ''}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('text', response.json()['error'])
+        response = self.author_client.delete(url)
+        self.assertEqual(response.status_code, HTTPStatus.NO_CONTENT)
+        self.assertEqual(
+            self.guest_client.get(url).status_code, HTTPStatus.NOT_FOUND
+        )
+
+    def test_comments(self):
+        url = reverse('api:comments', kwargs={'post_id': self.post.pk})
+        response = self.send_json(
+            self.reader_client, 'post', url, {'text': 'Комментарий'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.CREATED)
+        comment = Comment.objects.get()
+        results = self.guest_client.get(url).json()['results']
+        self.assertEqual(results, [{
+            'id': comment.pk,
+            'post': self.post.pk,
+            'author': 'reader',
+            'text': 'Комментарий',
+            'created': comment.created.isoformat(),
+        }])
+        missing = reverse('api:comments', kwargs={'post_id': 0})
+        self.assertEqual(
+            self.guest_client.get(missing).status_code, HTTPStatus.NOT_FOUND
+        )
+
+    def test_groups(self):
+        response = self.guest_client.get(
+            reverse('api:groups'), {'fields': 'slug'}
+        )
+        self.assertEqual(response.json(), {'results': [{'slug': 'test-slug'}]})
+
+    def test_follows_and_feed(self):
+        url = reverse('api:follows')
+        self.assertEqual(
+            self.guest_client.get(url).status_code, HTTPStatus.UNAUTHORIZED
+        )
+        response = self.send_json(
+            self.reader_client, 'post', url, {'usernames': ['auth']}
+        )
+        self.assertEqual(response.json()['followed'], ['auth'])
+        self.assertTrue(
+            Follow.objects.filter(user=self.reader, author=self.user).exists()
+        )
+        self.assertEqual(
+            self.reader_client.get(url).json(), {'results': ['auth']}
+        )
+        feed = self.reader_client.get(reverse('api:feed')).json()
+        self.assertEqual(feed['results'][0]['id'], self.post.pk)
+        response = self.send_json(
+            self.reader_client, 'delete', url, {'usernames': ['auth']}
+        )
+        self.assertEqual(response.json()['unfollowed'], ['auth'])
+        self.assertEqual(self.reader_client.get(url).json(), {'results': []})
@@ -0,0 +1,15 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.post_list, name='posts'),
+    path('posts/<int:post_id>/', views.post_item, name='post'),
+    path('posts/<int:post_id>/comments/', views.comment_list,
+         name='comments'),
+    path('groups/', views.group_list, name='groups'),
+    path('feed/', views.feed, name='feed'),
+    path('follows/', views.follow_list, name='follows'),
+]
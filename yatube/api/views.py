@@ -0,0 +1,285 @@
+"""JSON API для мобильных клиентов.
+
+Данные берутся теми же запросами, что и у HTML-страниц. Ответы на GET
+несут ETag, посчитанный по версиям областей кеша, как у versioned_page,
+и Last-Modified по самой свежей дате на странице. Для списков ETag
+известен до обращения к базе, поэтому ответ 304 обходится без SQL.
+"""
+import json
+from functools import wraps
+
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_http_methods
+
+from core.database import read_replica
+from posts import follows
+from posts.caching import conditional_response
+from posts.forms import CommentForm
+from posts.models import Group, Post, User
+from posts.renditions import schedule_renditions
+from posts.timeline import timeline_page
+from posts.views import (
+    BULK_FOLLOW_LIMIT, COUNT_ELEMS, get_comments_page, get_page_obj,
+    get_usernames,
+)
+
+from .forms import ApiPostForm
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def api_view(*methods):
+    """Разрешает только methods и превращает ApiError в JSON-ответ."""
+    def decorator(view):
+        @require_http_methods(methods)
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as error:
+                return JsonResponse(
+                    {'error': error.detail}, status=error.status
+                )
+        return wrapper
+    return decorator
+
+
+def require_login(request):
+    if not request.user.is_authenticated:
+        raise ApiError(401, 'Нужно войти')
+
+
+def read_json(request):
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        raise ApiError(400, 'Тело запроса не JSON')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'Ожидается JSON-объект')
+    return data
+
+
+def form_input(request):
+    """Данные формы из JSON или из обычного POST с файлами."""
+    if request.content_type == 'application/json':
+        return read_json(request), None
+    return request.POST, request.FILES
+
+
+def form_errors(form):
+    return {
+        field: [error['message'] for error in errors]
+        for field, errors in form.errors.get_json_data().items()
+    }
+
+
+def post_data(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+    }
+
+
+def comment_data(comment):
+    return {
+        'id': comment.pk,
+        'post': comment.post_id,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def group_data(group):
+    return {
+        'slug': group.slug,
+        'title': group.title,
+        'description': group.description,
+    }
+
+
+def pick_fields(request, items):
+    """Оставляет в объектах только поля из ?fields=id,text."""
+    fields = request.GET.get('fields')
+    if not fields or not items:
+        return items
+    fields = fields.split(',')
+    unknown = set(fields) - set(items[0])
+    if unknown:
+        raise ApiError(400, f'Нет полей: {", ".join(sorted(unknown))}')
+    return [{field: item[field] for field in fields} for item in items]
+
+
+def page_data(request, page, serialize):
+    return {
+        'results': pick_fields(request, [serialize(obj) for obj in page]),
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }
+
+
+def latest(objects, field):
+    return max((getattr(obj, field) for obj in objects), default=None)
+
+
+def conditional(request, scopes, build):
+    """GET с ETag и Last-Modified; build() -> (данные, самая свежая дата)."""
+    def respond():
+        data, modified = build()
+        return JsonResponse(data), modified
+
+    return conditional_response(request, scopes, respond)
+
+
+def create_post(request):
+    require_login(request)
+    form = ApiPostForm(*form_input(request))
+    if not form.is_valid():
+        raise ApiError(400, form_errors(form))
+    form.instance.author = request.user
+    post = form.save()
+    schedule_renditions(post)
+    return JsonResponse(post_data(post), status=201)
+
+
+@api_view('GET', 'POST')
+@read_replica
+def post_list(request):
+    if request.method == 'POST':
+        return create_post(request)
+    group = request.GET.get('group')
+    author = request.GET.get('author')
+    scopes = [f'group:{group}'] if group else []
+    if author:
+        scopes.append(f'author:{author}')
+
+    def build():
+        posts = Post.objects.feed()
+        if group:
+            posts = posts.filter(group__slug=group)
+        if author:
+            posts = posts.filter(author__username=author)
+        page = get_page_obj(request, posts)
+        return page_data(request, page, post_data), latest(page, 'pub_date')
+
+    return conditional(request, scopes or ['feed'], build)
+
+
+@api_view('GET', 'PATCH', 'DELETE')
+def post_item(request, post_id):
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id
+    ).first()
+    if post is None:
+        raise ApiError(404, 'Пост не найден')
+    if request.method == 'GET':
+        scopes = [f'post:{post.pk}', f'author:{post.author.username}']
+        if post.group:
+            scopes.append(f'group:{post.group.slug}')
+        return conditional(request, scopes, lambda: (
+            pick_fields(request, [post_data(post)])[0], post.pub_date
+        ))
+    require_login(request)
+    if request.user != post.author:
+        raise ApiError(403, 'Изменять пост может только автор')
+    if request.method == 'DELETE':
+        post.delete()
+        return HttpResponse(status=204)
+    # PATCH меняет только переданные поля
+    data = {
+        'text': post.text,
+        'group': post.group.slug if post.group else None,
+        **read_json(request),
+    }
+    form = ApiPostForm(data, instance=post)
+    if not form.is_valid():
+        raise ApiError(400, form_errors(form))
+    form.save()
+    return JsonResponse(post_data(post))
+
+
+@api_view('GET', 'POST')
+@read_replica
+def comment_list(request, post_id):
+    if request.method == 'POST':
+        require_login(request)
+        post = Post.objects.filter(pk=post_id).first()
+        if post is None:
+            raise ApiError(404, 'Пост не найден')
+        form = CommentForm(form_input(request)[0])
+        if not form.is_valid():
+            raise ApiError(400, form_errors(form))
+        comment = form.save(commit=False)
+        comment.author = request.user
+        comment.post = post
+        comment.save()
+        return JsonResponse(comment_data(comment), status=201)
+
+    def build():
+        page = get_comments_page(post_id, request.GET.get('cursor'))
+        if not page and not Post.objects.filter(pk=post_id).exists():
+            raise ApiError(404, 'Пост не найден')
+        return page_data(request, page, comment_data), latest(page, 'created')
+
+    return conditional(request, [f'comments:{post_id}'], build)
+
+
+@api_view('GET')
+@read_replica
+def group_list(request):
+    # Групп немного, они отдаются одним списком; любая правка группы
+    # сбрасывает область feed
+    def build():
+        groups = [group_data(group) for group in Group.objects.order_by(
+            'title', 'pk'
+        )]
+        return {'results': pick_fields(request, groups)}, None
+
+    return conditional(request, ['feed'], build)
+
+
+@api_view('GET')
+@read_replica
+def feed(request):
+    require_login(request)
+
+    def build():
+        page = timeline_page(
+            request.user, request.GET.get('cursor'), COUNT_ELEMS
+        )
+        return page_data(request, page, post_data), latest(page, 'pub_date')
+
+    return conditional(request, ['feed', f'follows:{request.user.pk}'], build)
+
+
+@api_view('GET', 'POST', 'DELETE')
+def follow_list(request):
+    """Авторы, на которых подписан читатель; POST подписывает,
+    DELETE отписывает от авторов из {"usernames": [...]}."""
+    require_login(request)
+    if request.method != 'GET':
+        usernames = get_usernames(request)
+        if usernames is None:
+            raise ApiError(
+                400, f'Нужно от 1 до {BULK_FOLLOW_LIMIT} имён в usernames'
+            )
+        if request.method == 'POST':
+            return JsonResponse(follows.follow_many(request.user, usernames))
+        return JsonResponse(follows.unfollow_many(request.user, usernames))
+
+    def build():
+        usernames = User.objects.filter(
+            following__user=request.user
+        ).order_by('username').values_list('username', flat=True)
+        return {'results': list(usernames)}, None
+
+    return conditional(request, [f'follows:{request.user.pk}'], build)
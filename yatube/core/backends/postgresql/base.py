@@ -0,0 +1,27 @@
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from core.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        if self.pool_reused:
+            # Для нового соединения это делает бэкенд Django
+            self.isolation_level = self.settings_dict['OPTIONS'].get(
+                'isolation_level', connection.isolation_level
+            )
+        return connection
+
+    @staticmethod
+    def check_pooled(connection):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        # Вне autocommit проверка открыла транзакцию
+        DatabaseWrapper.reset_pooled(connection)
+
+    @staticmethod
+    def reset_pooled(connection):
+        if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            connection.rollback()
@@ -0,0 +1,18 @@
+from django.db.backends.sqlite3 import base
+
+from core.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def pool_enabled(self):
+        # Базу в памяти Django и так не закрывает до конца тестов
+        return not self.is_in_memory_db()
+
+    @staticmethod
+    def check_pooled(connection):
+        connection.execute('SELECT 1')
+
+    @staticmethod
+    def reset_pooled(connection):
+        if connection.in_transaction:
+            connection.rollback()
@@ -0,0 +1,94 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .metrics import CACHE_HITS, CACHE_MISSES, collect
+from .profiling import record_cache
+
+MISSING = object()
+
+
+class CacheStatsMixin:
+    """Считает попадания и промахи чтения из кеша.
+
+    get и get_many у разных бэкендов вызывают друг друга, поэтому
+    учитывается только внешний вызов. Экземпляры бэкендов у Django
+    свои в каждом потоке, так что флаг на экземпляре безопасен.
+    """
+    _counting = False
+
+    def _record(self, hits, misses):
+        record_cache(hits, misses)
+        if hits:
+            CACHE_HITS.inc(hits, cache=self.key_prefix)
+        if misses:
+            CACHE_MISSES.inc(misses, cache=self.key_prefix)
+
+    def get(self, key, default=None, version=None):
+        if self._counting:
+            return super().get(key, default, version=version)
+        self._counting = True
+        try:
+            value = super().get(key, MISSING, version=version)
+        finally:
+            self._counting = False
+        if value is MISSING:
+            self._record(0, 1)
+            return default
+        self._record(1, 0)
+        return value
+
+    def get_many(self, keys, version=None):
+        if self._counting:
+            return super().get_many(keys, version=version)
+        keys = list(keys)
+        self._counting = True
+        try:
+            found = super().get_many(keys, version=version)
+        finally:
+            self._counting = False
+        self._record(len(found), len(keys) - len(found))
+        return found
+
+
+class StatsLocMemCache(CacheStatsMixin, LocMemCache):
+    pass
+
+
+class StatsFileBasedCache(CacheStatsMixin, FileBasedCache):
+    pass
+
+
+class StatsDatabaseCache(CacheStatsMixin, DatabaseCache):
+    pass
+
+
+try:
+    from django_redis.cache import RedisCache
+except ImportError:
+    RedisCache = None
+else:
+    class StatsRedisCache(CacheStatsMixin, RedisCache):
+        pass
+
+
+def cache_stats():
+    """Статистика по всем настроенным алиасам кеша.
+
+    Берётся из счётчиков /metrics, то есть сразу по всем воркерам.
+    """
+    samples = collect()
+    result = {}
+    for alias in settings.CACHES:
+        prefix = caches[alias].key_prefix
+        hits = int(samples.get(CACHE_HITS.key(cache=prefix), 0))
+        misses = int(samples.get(CACHE_MISSES.key(cache=prefix), 0))
+        total = hits + misses
+        result[alias] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / total, 4) if total else None,
+        }
+    return result
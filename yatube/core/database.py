@@ -0,0 +1,76 @@
+"""Настройка SQLite под конкурентную нагрузку.
+
+Каждое новое соединение получает PRAGMA из SQLITE_PRAGMAS: журнал
+WAL, в котором читатели не ждут писателя, ослабленный synchronous,
+mmap и увеличенный кеш страниц. Вьюхи лент, обёрнутые в read_replica,
+читают через отдельное соединение DATABASE_READ_REPLICA, открытое
+только для чтения; запись всегда идёт в default.
+
+Эти вьюхи кешируются под версиями областей, поэтому реплика не должна
+отставать: иначе после bump старые данные лягут в кеш под новой
+версией. В SQLite это тот же файл в режиме WAL, в PostgreSQL -
+синхронный резерв (settings_postgres).
+"""
+import threading
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+_local = threading.local()
+
+
+def apply_pragmas(connection, pragmas):
+    """Выполняет PRAGMA на соединении sqlite3 из стандартной библиотеки."""
+    for name, value in pragmas.items():
+        connection.execute(f'PRAGMA {name} = {value}')
+
+
+@receiver(connection_created)
+def tune_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Соединение из пула уже настроено
+    if getattr(connection, 'pool_reused', False):
+        return
+    # Сырое соединение: эти запросы не попадают в счётчики запросов
+    apply_pragmas(connection.connection, settings.SQLITE_PRAGMAS)
+    if connection.alias == settings.DATABASE_READ_REPLICA:
+        apply_pragmas(connection.connection, {'query_only': 'on'})
+
+
+def read_replica(view):
+    """Чтения из базы в GET-запросе идут через реплику, если она есть."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or not settings.DATABASE_READ_REPLICA):
+            return view(request, *args, **kwargs)
+        _local.reading = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _local.reading = False
+    return wrapper
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if getattr(_local, 'reading', False):
+            return settings.DATABASE_READ_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        # Объект, прочитанный из реплики, сохраняется в основную базу
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, settings.DATABASE_READ_REPLICA}
+        return obj1._state.db in aliases and obj2._state.db in aliases
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db == settings.DATABASE_READ_REPLICA:
+            return False
+        return None
@@ -0,0 +1,143 @@
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.database import apply_pragmas
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, author_id INTEGER, '
+    'text TEXT, pub_date TEXT)',
+    'CREATE INDEX post_feed ON post (pub_date DESC, id DESC)',
+)
+FEED_QUERY = (
+    'SELECT id, author_id, text, pub_date FROM post '
+    'ORDER BY pub_date DESC, id DESC LIMIT 11'
+)
+# Обычный таймаут Django: sqlite3.connect ждёт блокировку 5 секунд
+DEFAULT_TIMEOUT = 5
+
+
+def prepare(path, posts):
+    start = datetime(2020, 1, 1)
+    with sqlite3.connect(path) as connection:
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.executemany(
+            'INSERT INTO post (author_id, text, pub_date) VALUES (?, ?, ?)',
+            (
+                (i % 100, 'Текст поста ' * 20,
+                 (start + timedelta(minutes=i)).isoformat())
+                for i in range(posts)
+            ),
+        )
+    connection.close()
+
+
+class Worker(threading.Thread):
+    def __init__(self, path, pragmas, deadline, write):
+        super().__init__()
+        self.path = path
+        self.pragmas = pragmas
+        self.deadline = deadline
+        self.write = write
+        self.latencies = []
+        self.errors = 0
+
+    def step(self, connection):
+        if self.write:
+            with connection:
+                connection.execute(
+                    'INSERT INTO post (author_id, text, pub_date) '
+                    'VALUES (?, ?, ?)',
+                    (1, 'Новый пост', datetime.now().isoformat()),
+                )
+        else:
+            connection.execute(FEED_QUERY).fetchall()
+
+    def run(self):
+        connection = sqlite3.connect(self.path, timeout=DEFAULT_TIMEOUT)
+        apply_pragmas(connection, self.pragmas)
+        while time.perf_counter() < self.deadline:
+            start = time.perf_counter()
+            try:
+                self.step(connection)
+            except sqlite3.OperationalError:
+                self.errors += 1
+                continue
+            self.latencies.append(time.perf_counter() - start)
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность читателей ленты и писателей '
+        'в SQLite без настройки и с PRAGMA из SQLITE_PRAGMAS'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument(
+            '--posts', type=int, default=20000,
+            help='Сколько постов в базе перед замером',
+        )
+
+    def measure(self, path, pragmas, options):
+        deadline = time.perf_counter() + options['seconds']
+        workers = [
+            Worker(path, pragmas, deadline, write=False)
+            for _ in range(options['readers'])
+        ] + [
+            Worker(path, pragmas, deadline, write=True)
+            for _ in range(options['writers'])
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        result = {}
+        for kind, write in (('reads', False), ('writes', True)):
+            group = [worker for worker in workers if worker.write == write]
+            latencies = sorted(
+                latency for worker in group for latency in worker.latencies
+            )
+            if not latencies:
+                latencies = [0]
+            result[kind] = {
+                'per_second': round(len(latencies) / options['seconds'], 1),
+                'median_ms': round(statistics.median(latencies) * 1000, 2),
+                # Ожидание блокировки видно только в хвосте распределения
+                'p99_ms': round(
+                    latencies[int(len(latencies) * 0.99)] * 1000, 2
+                ),
+                'max_ms': round(latencies[-1] * 1000, 2),
+                'errors': sum(worker.errors for worker in group),
+            }
+        return result
+
+    def handle(self, *args, **options):
+        modes = (
+            ('default', {}),
+            ('tuned', settings.SQLITE_PRAGMAS),
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for mode, pragmas in modes:
+                path = os.path.join(directory, f'{mode}.sqlite3')
+                prepare(path, options['posts'])
+                result = self.measure(path, pragmas, options)
+                for kind, row in result.items():
+                    self.stdout.write(
+                        f'{mode:8} {kind:6} {row["per_second"]:>10}/с  '
+                        f'медиана {row["median_ms"]} мс  '
+                        f'p99 {row["p99_ms"]} мс  '
+                        f'максимум {row["max_ms"]} мс  '
+                        f'блокировок {row["errors"]}'
+                    )
@@ -0,0 +1,342 @@
+"""Метрики в текстовом формате Prometheus.
+
+Каждый процесс пишет свои счётчики в отдельный файл в METRICS_DIR,
+отображённый в память. Потоки процесса делят файл под общей
+блокировкой: запись стоит пару обращений к памяти, а число файлов не
+растёт с числом потоков. Страница /metrics складывает файлы всех
+воркеров.
+
+Формат файла: 8 байт занятой длины, затем записи
+[длина ключа][ключ][выравнивание до 8][double]. Ключ - готовая
+строка сэмпла, например yatube_cache_hits_total{cache="pages"}.
+Новая запись сначала пишется целиком, а длина обновляется последней,
+так что читатель не увидит её недописанной.
+
+Файлы завершившихся процессов сбор сводит в archive.metrics и удаляет:
+счётчики не обнуляются после перезапуска воркеров, а каталог не растёт.
+"""
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+USED = struct.Struct('Q')
+LENGTH = struct.Struct('I')
+VALUE = struct.Struct('d')
+INITIAL_SIZE = 64 * 1024
+ARCHIVE = 'archive.metrics'
+
+# Файлы процесса по каталогу; pid в ключе - после fork файл новый
+_files = {}
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    global _lock
+    _lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+# Все объявленные метрики в порядке вывода
+REGISTRY = []
+
+
+def _entries(data, used):
+    position = USED.size
+    while position < used:
+        (length,) = LENGTH.unpack_from(data, position)
+        key_end = position + LENGTH.size + length
+        value_position = key_end + (-key_end % VALUE.size)
+        key = bytes(data[position + LENGTH.size:key_end]).decode()
+        (value,) = VALUE.unpack_from(data, value_position)
+        yield key, value, value_position
+        position = value_position + VALUE.size
+
+
+class MetricsFile:
+    """Счётчики одного процесса; писать в файл может только он."""
+
+    def __init__(self, path):
+        self.file = open(path, 'a+b')
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.file.truncate(INITIAL_SIZE)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.used = USED.unpack_from(self.map, 0)[0] or USED.size
+        self.positions = {
+            key: position
+            for key, _, position in _entries(self.map, self.used)
+        }
+
+    def _append(self, key):
+        encoded = key.encode()
+        key_end = self.used + LENGTH.size + len(encoded)
+        value_position = key_end + (-key_end % VALUE.size)
+        end = value_position + VALUE.size
+        if end > len(self.map):
+            self.file.truncate(max(end, len(self.map) * 2))
+            self.map.resize(os.fstat(self.file.fileno()).st_size)
+        LENGTH.pack_into(self.map, self.used, len(encoded))
+        self.map[self.used + LENGTH.size:key_end] = encoded
+        VALUE.pack_into(self.map, value_position, 0.0)
+        USED.pack_into(self.map, 0, end)
+        self.used = end
+        self.positions[key] = value_position
+        return value_position
+
+    def add(self, key, amount):
+        position = self.positions.get(key)
+        if position is None:
+            position = self._append(key)
+        (value,) = VALUE.unpack_from(self.map, position)
+        VALUE.pack_into(self.map, position, value + amount)
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+def _process_file(directory):
+    key = (directory, os.getpid())
+    if key not in _files:
+        os.makedirs(directory, exist_ok=True)
+        _files[key] = MetricsFile(
+            os.path.join(directory, f'{os.getpid()}.metrics')
+        )
+    return _files[key]
+
+
+def _add(samples):
+    """Прибавляет пары (ключ, значение) к файлу текущего процесса."""
+    directory = settings.METRICS_DIR
+    with _lock:
+        metrics = _process_file(directory)
+        for key, amount in samples:
+            metrics.add(key, amount)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n'
+    )
+
+
+def _sample(name, labels):
+    if not labels:
+        return name
+    pairs = ','.join(f'{key}="{_escape(value)}"' for key, value in labels)
+    return f'{name}{{{pairs}}}'
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        REGISTRY.append(self)
+
+    def key(self, **labels):
+        """Строка сэмпла с этими метками, как её вернёт collect()."""
+        return _sample(self.name, [(key, labels[key]) for key in self.labels])
+
+    def inc(self, amount=1, **labels):
+        _add([(self.key(**labels), amount)])
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = (*buckets, float('inf'))
+        self.bucket_labels = [
+            '+Inf' if bucket == float('inf') else repr(float(bucket))
+            for bucket in self.buckets
+        ]
+        self.labels = labels
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        pairs = [(key, labels[key]) for key in self.labels]
+        # Все корзины пишутся сразу, по возрастанию: так они и лягут
+        # в файл, и порядок сохранится в выдаче
+        samples = [
+            (
+                _sample(f'{self.name}_bucket', [*pairs, ('le', le)]),
+                1 if value <= bucket else 0,
+            )
+            for bucket, le in zip(self.buckets, self.bucket_labels)
+        ]
+        samples.append((_sample(f'{self.name}_sum', pairs), value))
+        samples.append((_sample(f'{self.name}_count', pairs), 1))
+        _add(samples)
+
+
+REQUEST_SECONDS = Histogram(
+    'yatube_request_duration_seconds',
+    'Время ответа по имени вьюхи',
+    (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    labels=('view',),
+)
+REQUEST_QUERIES = Histogram(
+    'yatube_request_db_queries',
+    'Запросов к базе на один HTTP-запрос',
+    (0, 1, 2, 3, 5, 10, 20, 50, 100),
+    labels=('view',),
+)
+CACHE_HITS = Counter(
+    'yatube_cache_hits_total', 'Попадания в кеш', labels=('cache',)
+)
+CACHE_MISSES = Counter(
+    'yatube_cache_misses_total', 'Промахи мимо кеша', labels=('cache',)
+)
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_seconds',
+    'Время нарезки всех миниатюр одного поста',
+    (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+# Закешированные страницы отдаются без пагинатора, поэтому здесь
+# только промахи кеша, а не все просмотры
+PAGINATOR_DEPTH = Histogram(
+    'yatube_paginator_depth',
+    'Номер страницы, до которой долистали (только промахи кеша)',
+    (1, 2, 3, 5, 10, 20, 50, 100),
+    labels=('paginator',),
+)
+
+
+def _is_dead(name):
+    """Файл процесса, которого уже нет."""
+    try:
+        pid = int(name.split('.')[0].split('-')[0])
+    except ValueError:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def _read_entries(path):
+    with open(path, 'rb') as file:
+        data = file.read()
+    if len(data) < USED.size:
+        return []
+    (used,) = USED.unpack_from(data, 0)
+    return [
+        (key, value)
+        for key, value, _ in _entries(data, min(used, len(data)))
+    ]
+
+
+def merge_dead(directory):
+    """Переносит сэмплы завершившихся процессов в архив и удаляет их файлы."""
+    dead = [
+        name for name in os.listdir(directory)
+        if name.endswith('.metrics') and _is_dead(name)
+    ]
+    if not dead:
+        return
+    # Параллельный сбор в другом воркере не должен учесть файл дважды
+    with open(os.path.join(directory, f'{ARCHIVE}.lock'), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = MetricsFile(os.path.join(directory, ARCHIVE))
+        try:
+            for name in dead:
+                path = os.path.join(directory, name)
+                try:
+                    entries = _read_entries(path)
+                except FileNotFoundError:
+                    continue
+                for key, value in entries:
+                    archive.add(key, value)
+                os.remove(path)
+        finally:
+            archive.close()
+
+
+def collect():
+    """Суммы сэмплов по файлам всех потоков и процессов."""
+    directory = settings.METRICS_DIR
+    samples = defaultdict(float)
+    if not os.path.isdir(directory):
+        return samples
+    merge_dead(directory)
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.metrics'):
+            continue
+        try:
+            entries = _read_entries(os.path.join(directory, name))
+        except FileNotFoundError:
+            continue
+        for key, value in entries:
+            samples[key] += value
+    return samples
+
+
+def _value(value):
+    return repr(float(value))
+
+
+def exposition():
+    samples = collect()
+    lines = []
+    for metric in REGISTRY:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for key, value in samples.items():
+            if key.split('{')[0] in (
+                metric.name, f'{metric.name}_bucket',
+                f'{metric.name}_sum', f'{metric.name}_count',
+            ):
+                lines.append(f'{key} {_value(value)}')
+    # Доля попаданий считается при сборе из счётчиков выше
+    ratio = 'yatube_cache_hit_ratio'
+    lines.append(f'# HELP {ratio} Доля попаданий в кеш')
+    lines.append(f'# TYPE {ratio} gauge')
+    for key, hits in list(samples.items()):
+        if not key.startswith(f'{CACHE_HITS.name}{{'):
+            continue
+        labels = key[len(CACHE_HITS.name):]
+        total = hits + samples.get(CACHE_MISSES.name + labels, 0)
+        if total:
+            lines.append(f'{ratio}{labels} {_value(hits / total)}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Время ответа и число запросов к базе по каждой вьюхе."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        REQUEST_SECONDS.observe(duration, view=view)
+        REQUEST_QUERIES.observe(queries[0], view=view)
+        return response
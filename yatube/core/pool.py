@@ -0,0 +1,201 @@
+"""Пул соединений с базой, общий для потоков процесса.
+
+Django 2.2 открывает соединение на каждый запрос и закрывает его в
+конце, а с CONN_MAX_AGE держит по соединению на поток. Бэкенды из
+core.backends вместо этого берут готовое соединение из пула и в конце
+запроса возвращают его туда: connect, PRAGMA и прочая настройка
+случаются один раз на физическое соединение.
+
+Настройки пула - ключ POOL у базы в DATABASES:
+SIZE - сколько соединений выдаётся одновременно, остальные ждут;
+TIMEOUT - сколько секунд ждать свободного места;
+MAX_LIFETIME - через сколько секунд соединение закрывается;
+CHECK_INTERVAL - пролежавшее дольше этого соединение перед выдачей
+проверяется запросом SELECT 1.
+"""
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+from .metrics import Counter, Histogram
+
+POOL_DEFAULTS = {
+    'SIZE': 10,
+    'TIMEOUT': 10,
+    'MAX_LIFETIME': 600,
+    'CHECK_INTERVAL': 30,
+}
+
+POOL_WAIT_SECONDS = Histogram(
+    'yatube_db_pool_wait_seconds',
+    'Ожидание свободного соединения в пуле',
+    (0.0001, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+    labels=('database',),
+)
+POOL_CHECKOUTS = Counter(
+    'yatube_db_pool_checkouts_total',
+    'Выдачи соединений из пула: reused - готовое, new - новое',
+    labels=('database', 'source'),
+)
+POOL_DISCARDS = Counter(
+    'yatube_db_pool_discards_total',
+    'Соединения, закрытые пулом по возрасту, проверке или ошибке',
+    labels=('database',),
+)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    def __init__(self, alias, check, reset, size, timeout, max_lifetime,
+                 check_interval):
+        self.alias = alias
+        self.check = check
+        self.reset = reset
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        # Стек (соединение, когда открыто, когда вернули): последнее
+        # вернувшееся выдаётся первым, его страницы ещё в кеше
+        self._idle = []
+        self._opened = {}
+
+    def acquire(self, connect):
+        """Пара (соединение, взято ли оно из пула готовым).
+
+        connect() открывает новое соединение, если готовых нет.
+        """
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise OperationalError(
+                f'Нет свободного соединения с базой {self.alias} '
+                f'за {self.timeout} с'
+            )
+        POOL_WAIT_SECONDS.observe(
+            time.monotonic() - started, database=self.alias
+        )
+        try:
+            connection = self._take_idle()
+            if connection is not None:
+                POOL_CHECKOUTS.inc(database=self.alias, source='reused')
+                return connection, True
+            connection = connect()
+            self._opened[id(connection)] = time.monotonic()
+            POOL_CHECKOUTS.inc(database=self.alias, source='new')
+            return connection, False
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, opened, returned = self._idle.pop()
+            now = time.monotonic()
+            if now - opened > self.max_lifetime:
+                self._discard(connection)
+            elif (now - returned > self.check_interval
+                    and not self._healthy(connection)):
+                self._discard(connection)
+            else:
+                return connection
+
+    def _healthy(self, connection):
+        try:
+            self.check(connection)
+        except Exception:
+            return False
+        return True
+
+    def release(self, connection, reusable=True):
+        """Возвращает соединение; сломанное или старое закрывается."""
+        try:
+            opened = self._opened.get(id(connection))
+            if (not reusable or opened is None
+                    or time.monotonic() - opened > self.max_lifetime):
+                self._discard(connection)
+                return
+            try:
+                self.reset(connection)
+            except Exception:
+                self._discard(connection)
+                return
+            with self._lock:
+                self._idle.append((connection, opened, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def _discard(self, connection):
+        self._opened.pop(id(connection), None)
+        POOL_DISCARDS.inc(database=self.alias)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Закрывает простаивающие соединения."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _, _ in idle:
+            self._opened.pop(id(connection), None)
+            connection.close()
+
+
+def get_pool(wrapper):
+    """Пул базы, с которой работает обёртка соединения Django."""
+    settings_dict = wrapper.settings_dict
+    # Имя входит в ключ: тестовый раннер подменяет базу на время тестов
+    key = (wrapper.alias, settings_dict['NAME'])
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                options = {**POOL_DEFAULTS, **settings_dict.get('POOL', {})}
+                pool = _pools[key] = ConnectionPool(
+                    wrapper.alias,
+                    check=wrapper.check_pooled,
+                    reset=wrapper.reset_pooled,
+                    size=options['SIZE'],
+                    timeout=options['TIMEOUT'],
+                    max_lifetime=options['MAX_LIFETIME'],
+                    check_interval=options['CHECK_INTERVAL'],
+                )
+    return pool
+
+
+class PooledDatabaseWrapperMixin:
+    """Подмешивается к DatabaseWrapper бэкенда Django.
+
+    Подкласс задаёт check_pooled и reset_pooled: проверку живости
+    соединения и сброс незавершённой транзакции перед возвратом в пул.
+    """
+    pool = None
+    # Соединение взято из пула готовым, настраивать его не нужно
+    pool_reused = False
+
+    def pool_enabled(self):
+        return True
+
+    def get_new_connection(self, conn_params):
+        if not self.pool_enabled():
+            return super().get_new_connection(conn_params)
+        parent = super()
+        self.pool = get_pool(self)
+        connection, self.pool_reused = self.pool.acquire(
+            lambda: parent.get_new_connection(conn_params)
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        pool, self.pool = self.pool, None
+        pool.release(self.connection, reusable=not self.errors_occurred)
@@ -0,0 +1,163 @@
+"""Выборочное профилирование запросов.
+
+Каждый запрос с вероятностью PROFILING_SAMPLE_RATE измеряется:
+число и время SQL-запросов, время рендера шаблонов, попадания в кеш.
+Итоги копятся в памяти процесса по именам вьюх, отдаются через
+служебную страницу и раз в PROFILING_LOG_INTERVAL секунд пишутся в лог.
+Запросы без выборки не трогаются совсем.
+"""
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import (
+    DjangoTemplates, Template, reraise,
+)
+
+logger = logging.getLogger(__name__)
+
+FIELDS = (
+    'requests', 'total_ms', 'max_ms', 'sql_queries', 'sql_ms',
+    'template_ms', 'cache_hits', 'cache_misses',
+)
+
+_local = threading.local()
+_lock = threading.Lock()
+_views = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+_last_dump = time.monotonic()
+
+
+class Profile:
+    def __init__(self):
+        self.sql_queries = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Обёртка connection.execute_wrapper: работает и без DEBUG
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_queries += 1
+            self.sql_ms += (time.perf_counter() - start) * 1000
+
+
+def current_profile():
+    return getattr(_local, 'profile', None)
+
+
+def record_cache(hits, misses):
+    profile = current_profile()
+    if profile is not None:
+        profile.cache_hits += hits
+        profile.cache_misses += misses
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = current_profile()
+        if profile is None:
+            return super().render(context, request)
+        # Вложенный рендер уже входит во время внешнего
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_ms += (time.perf_counter() - start) * 1000
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """Шаблонный бэкенд Django, который засекает время рендера."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return ProfiledTemplate(
+                self.engine.get_template(template_name), self
+            )
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def record(view_name, total_ms, profile):
+    global _last_dump
+    with _lock:
+        row = _views[view_name]
+        row['requests'] += 1
+        row['total_ms'] += total_ms
+        row['max_ms'] = max(row['max_ms'], total_ms)
+        row['sql_queries'] += profile.sql_queries
+        row['sql_ms'] += profile.sql_ms
+        row['template_ms'] += profile.template_ms
+        row['cache_hits'] += profile.cache_hits
+        row['cache_misses'] += profile.cache_misses
+        now = time.monotonic()
+        dump = now - _last_dump >= settings.PROFILING_LOG_INTERVAL
+        if dump:
+            _last_dump = now
+    if dump:
+        logger.info('profile %s', json.dumps(profile_stats()))
+
+
+def profile_stats():
+    """Средние значения по каждой вьюхе с начала работы процесса."""
+    with _lock:
+        rows = {name: dict(row) for name, row in _views.items()}
+    result = {}
+    for name, row in sorted(rows.items()):
+        count = row['requests']
+        result[name] = {
+            'requests': count,
+            'avg_ms': round(row['total_ms'] / count, 2),
+            'max_ms': round(row['max_ms'], 2),
+            'avg_sql_queries': round(row['sql_queries'] / count, 2),
+            'avg_sql_ms': round(row['sql_ms'] / count, 2),
+            'avg_template_ms': round(row['template_ms'] / count, 2),
+            'cache_hits': row['cache_hits'],
+            'cache_misses': row['cache_misses'],
+        }
+    return result
+
+
+def reset_profile_stats():
+    with _lock:
+        _views.clear()
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.PROFILING_SAMPLE_RATE:
+            return self.get_response(request)
+        profile = Profile()
+        _local.profile = profile
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+        total_ms = (time.perf_counter() - start) * 1000
+        match = request.resolver_match
+        record(match.view_name if match else 'unresolved', total_ms, profile)
+        return response
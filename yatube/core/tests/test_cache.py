@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..cache import StatsFileBasedCache, cache_stats
+from ..metrics import CACHE_HITS, CACHE_MISSES, MetricsFile
+
+User = get_user_model()
+
+
+class CacheStatsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_hits_and_misses_are_counted(self):
+        before = cache_stats()['default']
+        cache.get('missing')
+        cache.set('present', 1)
+        cache.get('present')
+        cache.get_many(['present', 'missing'])
+        after = cache_stats()['default']
+        self.assertEqual(after['hits'] - before['hits'], 2)
+        self.assertEqual(after['misses'] - before['misses'], 2)
+
+    def test_file_cache_is_shared_between_instances(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        worker = StatsFileBasedCache(location, {'KEY_PREFIX': 'pages'})
+        other_worker = StatsFileBasedCache(location, {'KEY_PREFIX': 'pages'})
+        worker.set('key', 'value')
+        self.assertEqual(other_worker.get('key'), 'value')
+        other_worker.delete('key')
+        self.assertIsNone(worker.get('key'))
+
+    def test_stats_endpoint_is_staff_only(self):
+        staff = User.objects.create_user('staff', is_staff=True)
+        user = User.objects.create_user('user')
+        url = reverse('cache_stats')
+        staff_client = Client()
+        staff_client.force_login(staff)
+        user_client = Client()
+        user_client.force_login(user)
+        self.assertEqual(user_client.get(url).status_code, HTTPStatus.FOUND)
+        response = staff_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIn('pages', response.json())
+
+    def test_stats_include_other_workers(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(METRICS_DIR=directory):
+            # Файл потока другого воркера того же процесса
+            worker = MetricsFile(
+                os.path.join(directory, f'{os.getpid()}-0.metrics')
+            )
+            worker.add(CACHE_HITS.key(cache='pages'), 3)
+            worker.add(CACHE_MISSES.key(cache='pages'), 1)
+            worker.close()
+            self.assertEqual(cache_stats()['pages'], {
+                'hits': 3, 'misses': 1, 'hit_ratio': 0.75,
+            })
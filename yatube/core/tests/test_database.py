@@ -0,0 +1,66 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test import override_settings
+
+from posts.models import Post
+
+from ..database import ReadReplicaRouter, read_replica
+
+
+class PragmasTest(TestCase):
+    def test_connection_is_tuned(self):
+        with connection.cursor() as cursor:
+            for pragma, expected in (
+                ('busy_timeout', 20000),
+                ('cache_size', -64000),
+                ('synchronous', 1),
+            ):
+                with self.subTest(pragma=pragma):
+                    cursor.execute(f'PRAGMA {pragma}')
+                    self.assertEqual(cursor.fetchone()[0], expected)
+
+
+class ReadReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReadReplicaRouter()
+        self.factory = RequestFactory()
+        self.seen = []
+
+        @read_replica
+        def view(request):
+            self.seen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        self.view = view
+
+    @override_settings(DATABASE_READ_REPLICA='replica')
+    def test_feed_reads_go_to_replica(self):
+        self.view(self.factory.get('/'))
+        self.view(self.factory.post('/'))
+        self.assertEqual(self.seen, ['replica', None])
+        self.assertIsNone(self.router.db_for_read(Post))
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+
+    def test_without_replica_nothing_changes(self):
+        self.view(self.factory.get('/'))
+        self.assertEqual(self.seen, [None])
+
+
+class BenchSqliteTest(SimpleTestCase):
+    def test_benchmark_reports_both_modes(self):
+        out = StringIO()
+        call_command(
+            'bench_sqlite', readers=1, writers=1, seconds=0.2, posts=100,
+            stdout=out,
+        )
+        lines = out.getvalue().splitlines()
+        self.assertEqual(
+            [line.split()[:2] for line in lines],
+            [['default', 'reads'], ['default', 'writes'],
+             ['tuned', 'reads'], ['tuned', 'writes']],
+        )
@@ -0,0 +1,138 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..metrics import (
+    ARCHIVE, INITIAL_SIZE, Counter, MetricsFile, REGISTRY, collect,
+)
+
+User = get_user_model()
+METRICS_DIR = tempfile.mkdtemp()
+
+
+@override_settings(METRICS_DIR=METRICS_DIR)
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        for i in range(12):
+            Post.objects.create(author=cls.user, text=f'Пост {i}')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_file_grows_and_reopens(self):
+        path = os.path.join(METRICS_DIR, 'grow.metrics')
+        metrics = MetricsFile(path)
+        keys = [f'metric_{"x" * 100}{{n="{i}"}}' for i in range(1000)]
+        for key in keys:
+            metrics.add(key, 1)
+        metrics.add(keys[0], 2.5)
+        self.assertGreater(os.path.getsize(path), INITIAL_SIZE)
+        reopened = MetricsFile(path)
+        reopened.add(keys[-1], 1)
+        samples = collect()
+        self.assertEqual(samples[keys[0]], 3.5)
+        self.assertEqual(samples[keys[-1]], 2)
+
+    def test_threads_are_summed(self):
+        counter = Counter('test_threads_total', 'Тест')
+        self.addCleanup(REGISTRY.remove, counter)
+        threads = [
+            threading.Thread(target=counter.inc, args=(5,))
+            for _ in range(3)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        counter.inc()
+        self.assertEqual(collect()['test_threads_total'], 16)
+        # Потоки пишут в общий файл процесса
+        self.assertEqual(
+            [name for name in os.listdir(METRICS_DIR)
+             if name.startswith(str(os.getpid()))],
+            [f'{os.getpid()}.metrics'],
+        )
+
+    def test_dead_processes_are_archived(self):
+        process = subprocess.Popen(['true'])
+        process.wait()
+        path = os.path.join(METRICS_DIR, f'{process.pid}-1.metrics')
+        metrics = MetricsFile(path)
+        metrics.add('test_dead_total', 2)
+        metrics.close()
+        alive = Counter('test_dead_total', 'Тест')
+        self.addCleanup(REGISTRY.remove, alive)
+        alive.inc()
+        self.assertEqual(collect()['test_dead_total'], 3)
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(os.path.join(METRICS_DIR, ARCHIVE)))
+        self.assertEqual(collect()['test_dead_total'], 3)
+
+    def test_endpoint_exposes_views_cache_and_paginator(self):
+        first_page = self.guest_client.get(reverse('posts:index'))
+        cursor = first_page.context['page_obj'].next_cursor
+        self.guest_client.get(reverse('posts:index'), {'cursor': cursor})
+        self.guest_client.get(reverse('posts:index'), {'cursor': cursor})
+        with self.settings(METRICS_TOKEN='secret'):
+            response = self.guest_client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret'
+            )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        body = response.content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram', body)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 3.0',
+            body,
+        )
+        self.assertIn(
+            'yatube_request_db_queries_bucket{view="posts:index",le="+Inf"}',
+            body,
+        )
+        self.assertIn('yatube_cache_hit_ratio{cache="pages"} 0.', body)
+        self.assertIn(
+            'yatube_paginator_depth_bucket{paginator="posts",le="1.0"} 1.0',
+            body,
+        )
+        # Третий запрос отдан из кеша и пагинатор не трогал
+        self.assertIn(
+            'yatube_paginator_depth_count{paginator="posts"} 2.0', body
+        )
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_is_closed_to_strangers(self):
+        url = reverse('metrics')
+        # За локальным прокси любой запрос приходит с 127.0.0.1
+        for headers in (
+            {'REMOTE_ADDR': '127.0.0.1'},
+            {'HTTP_AUTHORIZATION': 'Bearer wrong'},
+        ):
+            with self.subTest(headers=headers):
+                response = self.guest_client.get(url, **headers)
+                self.assertEqual(response.status_code, HTTPStatus.FORBIDDEN)
+        with self.settings(METRICS_ALLOWED_IPS=['10.0.0.2']):
+            response = self.guest_client.get(url, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        staff = User.objects.create_user('staff', is_staff=True)
+        staff_client = Client()
+        staff_client.force_login(staff)
+        response = staff_client.get(url, REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
@@ -0,0 +1,100 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase
+
+from ..pool import ConnectionPool, _pools
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'pool.sqlite3')
+        self.opened = []
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.opened.append(connection)
+        return connection
+
+    def make_pool(self, **options):
+        pool = ConnectionPool(
+            'test',
+            check=lambda connection: connection.execute('SELECT 1'),
+            reset=lambda connection: connection.rollback(),
+            **{'size': 2, 'timeout': 0.1, 'max_lifetime': 60,
+               'check_interval': 30, **options},
+        )
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_released_connection_is_reused(self):
+        pool = self.make_pool()
+        connection, reused = pool.acquire(self.connect)
+        self.assertFalse(reused)
+        connection.execute('CREATE TABLE t (x)')
+        connection.execute('INSERT INTO t VALUES (1)')
+        pool.release(connection)
+        again, reused = pool.acquire(self.connect)
+        self.assertIs(again, connection)
+        self.assertTrue(reused)
+        # Незавершённая транзакция откатилась при возврате
+        self.assertEqual(again.execute('SELECT count(*) FROM t').fetchone(),
+                         (0,))
+        pool.release(again)
+
+    def test_waits_for_free_slot(self):
+        pool = self.make_pool(size=1)
+        connection, _ = pool.acquire(self.connect)
+        with self.assertRaises(OperationalError):
+            pool.acquire(self.connect)
+        timer = threading.Timer(0.02, pool.release, [connection])
+        timer.start()
+        again, reused = pool.acquire(self.connect)
+        timer.join()
+        self.assertIs(again, connection)
+        pool.release(again)
+
+    def test_old_broken_and_failed_connections_are_replaced(self):
+        for options, spoil in (
+            ({'max_lifetime': 0}, lambda connection: None),
+            ({'check_interval': 0}, lambda connection: connection.close()),
+        ):
+            with self.subTest(options=options):
+                pool = self.make_pool(**options)
+                connection, _ = pool.acquire(self.connect)
+                pool.release(connection)
+                spoil(connection)
+                again, reused = pool.acquire(self.connect)
+                self.assertIsNot(again, connection)
+                self.assertFalse(reused)
+                pool.release(again, reusable=False)
+                self.assertEqual(pool.acquire(self.connect)[1], False)
+
+
+class PooledBackendTest(SimpleTestCase):
+    def test_django_connection_goes_back_to_pool(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections = ConnectionHandler({'default': {
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': os.path.join(directory.name, 'pooled.sqlite3'),
+        }})
+        wrapper = connections['default']
+        wrapper.ensure_connection()
+        raw = wrapper.connection
+        self.assertFalse(wrapper.pool_reused)
+        wrapper.close()
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, raw)
+        self.assertTrue(wrapper.pool_reused)
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+        wrapper.close()
+        _pools.pop(('default', wrapper.settings_dict['NAME'])).close()
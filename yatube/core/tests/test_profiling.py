@@ -0,0 +1,61 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+
+from ..profiling import profile_stats, reset_profile_stats
+
+User = get_user_model()
+
+
+@override_settings(PROFILING_SAMPLE_RATE=1)
+class ProfilingTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+        reset_profile_stats()
+
+    def test_sampled_request_is_recorded(self):
+        self.guest_client.get(reverse('posts:index'))
+        self.guest_client.get(reverse('posts:index'))
+        row = profile_stats()['posts:index']
+        self.assertEqual(row['requests'], 2)
+        self.assertGreater(row['avg_sql_queries'], 0)
+        self.assertGreater(row['avg_template_ms'], 0)
+        self.assertGreater(row['cache_hits'], 0)
+        self.assertGreater(row['cache_misses'], 0)
+
+    @override_settings(PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_recorded(self):
+        self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(profile_stats(), {})
+
+    @override_settings(PROFILING_LOG_INTERVAL=0)
+    def test_summary_is_logged(self):
+        with self.assertLogs('core.profiling', 'INFO') as logs:
+            self.guest_client.get(reverse('about:tech'))
+        self.assertIn('about:tech', logs.output[0])
+
+    def test_stats_endpoint_is_staff_only(self):
+        staff = User.objects.create_user('staff', is_staff=True)
+        staff_client = Client()
+        staff_client.force_login(staff)
+        user_client = Client()
+        user_client.force_login(self.user)
+        url = reverse('profile_stats')
+        self.assertEqual(user_client.get(url).status_code, HTTPStatus.FOUND)
+        reset_profile_stats()
+        self.guest_client.get(reverse('posts:index'))
+        response = staff_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['posts:index']['requests'], 1)
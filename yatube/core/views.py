@@ -1,5 +1,15 @@
+import hmac
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
 
+from .cache import cache_stats
+from .metrics import exposition
+from .profiling import profile_stats
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию;
@@ -16,4 +26,36 @@ def server_error(request):
 
 
 def permission_denied(request, exception):
-    return render(request, 'core/403.html', status=403)
\ No newline at end of file
+    return render(request, 'core/403.html', status=403)
+
+
+@staff_member_required
+def cache_stats_view(request):
+    return JsonResponse(cache_stats())
+
+
+@staff_member_required
+def profile_stats_view(request):
+    return JsonResponse(profile_stats())
+
+
+def metrics_allowed(request):
+    """Сборщик метрик приходит с токеном METRICS_TOKEN, люди - под
+    сотрудником. Адреса из METRICS_ALLOWED_IPS пускаются без проверок:
+    за локальным прокси все запросы идут с 127.0.0.1, поэтому по
+    умолчанию список пуст."""
+    if request.user.is_staff:
+        return True
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and hmac.compare_digest(header, f'Bearer {token}'):
+        return True
+    return request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+
+
+def metrics_view(request):
+    if not metrics_allowed(request):
+        raise PermissionDenied
+    return HttpResponse(
+        exposition(), content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
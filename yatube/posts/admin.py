@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from .models import Post, Group
+from .search import matching_posts
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -16,6 +17,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Вместо LIKE '%q%' по всей таблице ищем по полнотекстовому индексу
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=matching_posts(search_term)), False
+
 
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group)
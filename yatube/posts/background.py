@@ -0,0 +1,40 @@
+"""Фоновый пул потоков для работы, которой не место в запросе.
+
+Задача ставится после коммита транзакции, чтобы видеть её данные.
+Пул один на процесс: нарезка миниатюр и раскладка постов по лентам.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_WORKERS,
+            thread_name_prefix='background',
+        )
+    return _executor
+
+
+def _run(func, args):
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s%r не выполнена',
+                         func.__name__, args)
+    finally:
+        close_old_connections()
+
+
+def submit(func, *args):
+    """Выполняет func(*args) в пуле после коммита текущей транзакции."""
+    transaction.on_commit(lambda: get_executor().submit(_run, func, args))
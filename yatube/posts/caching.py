@@ -0,0 +1,147 @@
+import calendar
+import hashlib
+import time
+from functools import wraps
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+VERSION_KEY = 'posts:version:{}'
+PAGE_KEY = 'posts:page:{}'
+
+
+def _initial_version():
+    # Версия, заведённая заново после вытеснения ключа, не должна
+    # совпасть со старой, иначе оживут устаревшие страницы.
+    return int(time.time() * 1000)
+
+
+def get_versions(scopes):
+    cache = caches['pages']
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _initial_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*scopes):
+    """Сбрасывает все закешированные страницы, зависящие от scopes.
+
+    Внутри транзакции версии сдвигаются сразу, для чтений в ней же, и
+    ещё раз после коммита: параллельный читатель мог успеть положить
+    в кеш данные до коммита под промежуточной версией.
+    """
+    scopes = set(scopes)
+    _bump(scopes)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(scopes))
+
+
+def _bump(scopes):
+    cache = caches['pages']
+    for scope in scopes:
+        key = VERSION_KEY.format(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_version(), timeout=None)
+
+
+def post_scopes(post):
+    """Области кеша, в которых показывается пост."""
+    scopes = ['feed', f'post:{post.pk}', f'author:{post.author.username}']
+    if post.group_id:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+def fragment_versions(**scopes):
+    """Версии областей по именам, для ключей {% cache %} в шаблонах."""
+    return dict(zip(scopes, get_versions(list(scopes.values()))))
+
+
+def viewer_key(request):
+    user = request.user
+    if not user.is_authenticated:
+        return 'anon'
+    # Ключ сессии меняется при входе вместе с CSRF-токеном,
+    # поэтому закешированная форма не унесёт чужой токен.
+    return f'{user.pk}:{request.session.session_key}'
+
+
+def page_key(request, scopes, params=()):
+    # Только параметры, которые читает вьюха: мусор в адресе не
+    # размножает копии страницы в кеше
+    raw = '|'.join((
+        request.path,
+        *(f'{name}={request.GET.get(name, "")}' for name in params),
+        viewer_key(request),
+        *map(str, get_versions(scopes)),
+    ))
+    return PAGE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def versioned_page(*scope_templates, params=('cursor',)):
+    """Кеширует страницу до изменения любой из её областей.
+
+    Шаблоны областей подставляются из аргументов URL и id читателя:
+    ``@versioned_page('group:{slug}')``, ``'follows:{user}'``.
+    В ключ страницы входят только GET-параметры из params.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            scopes = [
+                template.format(user=request.user.pk, **kwargs)
+                for template in scope_templates
+            ]
+            cache = caches['pages']
+            key = page_key(request, scopes, params)
+            response = cache.get(key)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    cache.set(key, response)
+            return response
+        return wrapper
+    return decorator
+
+
+def scoped_etag(request, scopes):
+    raw = '|'.join((
+        request.get_full_path(),
+        str(request.user.pk),
+        *map(str, get_versions(scopes)),
+    ))
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def conditional_response(request, scopes, build):
+    """Ответ на GET с учётом If-None-Match и If-Modified-Since.
+
+    ETag считается по версиям областей, так что 304 отдаётся без
+    запросов к базе. build() вызывается, только если у клиента
+    устаревшие данные, и возвращает пару (ответ, самая свежая дата
+    или None). Правка поста не меняет его дату, поэтому клиентам
+    стоит слать If-None-Match: он главнее If-Modified-Since.
+    """
+    etag = scoped_etag(request, scopes)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+    response, modified = build()
+    response['ETag'] = etag
+    last_modified = None
+    if modified is not None:
+        last_modified = calendar.timegm(modified.utctimetuple())
+        response['Last-Modified'] = http_date(last_modified)
+    return get_conditional_response(
+        request, etag=etag, last_modified=last_modified, response=response
+    )
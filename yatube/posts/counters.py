@@ -0,0 +1,176 @@
+from django.db import connection, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, User, UserStats
+
+
+def bump_user_counters(user_ids, field, delta):
+    """Атомарно изменяет счётчик у всех пользователей на delta."""
+    stats = UserStats.objects.filter(user_id__in=user_ids)
+    if delta > 0:
+        UserStats.objects.bulk_create(
+            (UserStats(user_id=user_id) for user_id in user_ids),
+            ignore_conflicts=True,
+        )
+    else:
+        # Счётчик не уходит в минус, даже если успел разойтись с данными.
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    stats.update(**{field: F(field) + delta})
+
+
+def bump_user_counter(user_id, field, delta):
+    bump_user_counters([user_id], field, delta)
+
+
+def shift_follow_counters(user_id, author_ids, delta):
+    """Сдвигает followers_count авторов и following_count читателя
+    одним запросом. Возвращает {id автора: новое число подписчиков}.
+    """
+    table = UserStats._meta.db_table
+    following = delta * len(author_ids)
+    if delta > 0:
+        rows = [(author_id, delta, 0) for author_id in author_ids]
+        rows.append((user_id, 0, following))
+        sql = (
+            f'INSERT INTO {table} '
+            f'(user_id, posts_count, followers_count, following_count) '
+            f'VALUES {", ".join(["(%s, 0, %s, %s)"] * len(rows))} '
+            f'ON CONFLICT (user_id) DO UPDATE SET '
+            f'followers_count = {table}.followers_count '
+            f'+ excluded.followers_count, '
+            f'following_count = {table}.following_count '
+            f'+ excluded.following_count '
+        )
+        params = [value for row in rows for value in row]
+    else:
+        # Счётчик не уходит в минус, даже если успел разойтись с данными.
+        authors = ', '.join(['%s'] * len(author_ids))
+        sql = (
+            f'UPDATE {table} SET '
+            f'followers_count = CASE WHEN user_id IN ({authors}) '
+            f'AND followers_count >= %s THEN followers_count + %s '
+            f'ELSE followers_count END, '
+            f'following_count = CASE WHEN user_id = %s '
+            f'AND following_count >= %s THEN following_count + %s '
+            f'ELSE following_count END '
+            f'WHERE user_id IN ({authors}, %s) '
+        )
+        params = [
+            *author_ids, -delta, delta,
+            user_id, -following, following,
+            *author_ids, user_id,
+        ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql + 'RETURNING user_id, followers_count', params)
+        return {
+            pk: followers for pk, followers in cursor.fetchall()
+            if pk != user_id
+        }
+
+
+def bump_post_comments(post_id, delta):
+    posts = Post.objects.filter(pk=post_id)
+    if delta < 0:
+        posts = posts.filter(comments_count__gte=-delta)
+    posts.update(comments_count=F('comments_count') + delta)
+
+
+def _counted(queryset, field):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0,
+    )
+
+
+USER_COUNTERS = ('posts_count', 'followers_count', 'following_count')
+
+
+def actual_user_counters():
+    return User.objects.annotate(
+        posts_count=_counted(Post.objects.all(), 'author'),
+        followers_count=_counted(Follow.objects.all(), 'author'),
+        following_count=_counted(Follow.objects.all(), 'user'),
+    ).values_list('pk', *USER_COUNTERS)
+
+
+def actual_post_counters():
+    return Post.objects.annotate(
+        actual_comments=_counted(Comment.objects.all(), 'post'),
+    )
+
+
+def find_inconsistencies():
+    """Возвращает список расхождений счётчиков с реальными данными."""
+    problems = []
+    stats = {
+        user_id: counters
+        for user_id, *counters in UserStats.objects.values_list(
+            'user_id', *USER_COUNTERS
+        )
+    }
+    empty = [0] * len(USER_COUNTERS)
+    for user_id, *actual in actual_user_counters().iterator():
+        stored = stats.get(user_id, empty)
+        for field, stored_value, actual_value in zip(
+            USER_COUNTERS, stored, actual
+        ):
+            if stored_value != actual_value:
+                problems.append(
+                    ('user', user_id, field, stored_value, actual_value)
+                )
+    for post_id, stored, actual in actual_post_counters().exclude(
+        comments_count=F('actual_comments')
+    ).values_list('pk', 'comments_count', 'actual_comments').iterator():
+        problems.append(('post', post_id, 'comments_count', stored, actual))
+    return problems
+
+
+BATCH_SIZE = 500
+
+
+@transaction.atomic
+def rebuild_counters():
+    """Пересчитывает все счётчики с нуля.
+
+    Каждый счётчик считается одним группирующим запросом, а в базу
+    пишутся только разошедшиеся строки.
+    """
+    actual = {}
+    for index, (model, field) in enumerate((
+        (Post, 'author'), (Follow, 'author'), (Follow, 'user'),
+    )):
+        totals = model.objects.order_by().values_list(field).annotate(
+            total=Count('pk')
+        )
+        for user_id, total in totals.iterator():
+            actual.setdefault(user_id, [0] * len(USER_COUNTERS))[index] = total
+    stored = {
+        user_id: counters
+        for user_id, *counters in UserStats.objects.values_list(
+            'user_id', *USER_COUNTERS
+        ).iterator()
+    }
+    empty = [0] * len(USER_COUNTERS)
+    changed, missing = [], []
+    for user_id in User.objects.values_list('pk', flat=True).iterator():
+        counters = actual.get(user_id, empty)
+        if stored.get(user_id) == counters:
+            continue
+        stats = UserStats(
+            user_id=user_id, **dict(zip(USER_COUNTERS, counters))
+        )
+        (changed if user_id in stored else missing).append(stats)
+    UserStats.objects.bulk_update(
+        changed, USER_COUNTERS, batch_size=BATCH_SIZE
+    )
+    UserStats.objects.bulk_create(missing, batch_size=BATCH_SIZE)
+    Post.objects.update(
+        comments_count=_counted(Comment.objects.all(), 'post')
+    )
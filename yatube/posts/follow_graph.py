@@ -0,0 +1,68 @@
+"""Кеш графа подписок для проверок «подписан ли читатель на автора».
+
+Для каждого читателя хранится отсортированный массив id авторов:
+в памяти процесса и в общем кеше, под версией области follows:{user},
+которую сбрасывает любая подписка и отписка. Массив заполняется при
+первом обращении, проверка - двоичный поиск по нему.
+"""
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .caching import get_versions
+from .models import Follow
+
+KEY = 'posts:following:{}:{}'
+TYPECODE = 'q'
+
+_local = OrderedDict()
+_lock = threading.Lock()
+
+
+def _remember(user_id, version, ids):
+    with _lock:
+        _local[user_id] = (version, ids)
+        _local.move_to_end(user_id)
+        while len(_local) > settings.FOLLOW_GRAPH_LOCAL_SIZE:
+            _local.popitem(last=False)
+
+
+def following_ids(user_id):
+    """Отсортированный массив id авторов, на которых подписан user_id."""
+    (version,) = get_versions([f'follows:{user_id}'])
+    with _lock:
+        cached = _local.get(user_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    cache = caches['follow_graph']
+    key = KEY.format(user_id, version)
+    ids = array(TYPECODE)
+    packed = cache.get(key)
+    if packed is None:
+        # Уникальный индекс (user, author) отдаёт id уже по порядку
+        ids.extend(Follow.objects.filter(user_id=user_id).order_by(
+            'author_id'
+        ).values_list('author_id', flat=True))
+        cache.set(key, ids.tobytes())
+    else:
+        ids.frombytes(packed)
+    _remember(user_id, version, ids)
+    return ids
+
+
+def _contains(ids, author_id):
+    position = bisect_left(ids, author_id)
+    return position < len(ids) and ids[position] == author_id
+
+
+def is_following(user_id, author_id):
+    return _contains(following_ids(user_id), author_id)
+
+
+def clear_local():
+    with _lock:
+        _local.clear()
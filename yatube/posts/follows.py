@@ -0,0 +1,132 @@
+"""Граф подписок.
+
+Пара (user, author) уникальна на уровне базы, поэтому повторная
+подписка или отписка ничего не меняет. Одиночные и массовые операции
+пишут одним запросом в обход сигналов и применяют те же эффекты сразу
+для всех затронутых авторов. Такой запрос возвращает через RETURNING
+только строки, которые он действительно вставил или удалил
+(SQLite 3.35+, PostgreSQL), так что параллельная подписка
+не посчитается дважды.
+"""
+from django.db import connection, transaction
+
+from . import caching, follow_graph, timeline
+from .counters import shift_follow_counters
+from .models import Follow, User
+
+
+def is_following(user, author):
+    return user.is_authenticated and follow_graph.is_following(
+        user.pk, author.pk
+    )
+
+
+def follow(user, author):
+    """Подписывает user на author. True, если подписки раньше не было."""
+    if user.pk == author.pk:
+        return False
+    return bool(_follow(user, [author]))
+
+
+def unfollow(user, author):
+    """Отписывает user от author. True, если подписка была."""
+    return bool(_unfollow(user, [author]))
+
+
+def _resolve(user, usernames):
+    usernames = list(dict.fromkeys(usernames))
+    authors = {
+        author.username: author
+        for author in User.objects.filter(username__in=usernames)
+    }
+    missing = [name for name in usernames if name not in authors]
+    authors.pop(user.username, None)
+    return authors, missing
+
+
+def _changed(user, authors):
+    caching.bump(
+        f'follows:{user.pk}',
+        f'author:{user.username}',
+        *(f'author:{author.username}' for author in authors),
+    )
+
+
+def _returning(sql, params):
+    """Выполняет запрос с RETURNING author_id, возвращает эти id."""
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return {row[0] for row in cursor.fetchall()}
+
+
+@transaction.atomic
+def _follow(user, authors):
+    """Подписывает на авторов, возвращает тех, на кого подписки не было."""
+    # Уже существующие пары, в том числе вставленные параллельным
+    # запросом, пропускает уникальный индекс
+    inserted = _returning(
+        f'INSERT INTO {Follow._meta.db_table} (user_id, author_id) '
+        f'VALUES {", ".join(["(%s, %s)"] * len(authors))} '
+        f'ON CONFLICT DO NOTHING RETURNING author_id',
+        [pk for author in authors for pk in (user.pk, author.pk)],
+    )
+    new = [author for author in authors if author.pk in inserted]
+    if new:
+        ids = [author.pk for author in new]
+        shift_follow_counters(user.pk, ids, 1)
+        timeline.backfill(user.pk, *ids)
+        _changed(user, new)
+    return new
+
+
+@transaction.atomic
+def _unfollow(user, authors):
+    """Отписывает от авторов, возвращает тех, на кого подписка была."""
+    deleted = _returning(
+        f'DELETE FROM {Follow._meta.db_table} WHERE user_id = %s '
+        f'AND author_id IN ({", ".join(["%s"] * len(authors))}) '
+        f'RETURNING author_id',
+        [user.pk, *(author.pk for author in authors)],
+    )
+    gone = [author for author in authors if author.pk in deleted]
+    if gone:
+        ids = [author.pk for author in gone]
+        followers = shift_follow_counters(user.pk, ids, -1)
+        timeline.trim(user.pk, *ids)
+        timeline.schedule_fan_in(followers)
+        _changed(user, gone)
+    return gone
+
+
+def follow_many(user, usernames):
+    """Подписывает на всех найденных авторов сразу.
+
+    Возвращает списки имён: на кого подписались, на кого подписка уже
+    была (или это сам user) и кого не нашли.
+    """
+    authors, missing = _resolve(user, usernames)
+    new = _follow(user, list(authors.values())) if authors else []
+    followed = {author.username for author in new}
+    return {
+        'followed': [name for name in authors if name in followed],
+        'unchanged': [
+            name for name in dict.fromkeys(usernames)
+            if name not in followed and name not in missing
+        ],
+        'missing': missing,
+    }
+
+
+def unfollow_many(user, usernames):
+    """Отписывает от всех перечисленных авторов сразу."""
+    authors, missing = _resolve(user, usernames)
+    gone = _unfollow(user, list(authors.values())) if authors else []
+    unfollowed = {author.username for author in gone}
+    return {
+        'unfollowed': [name for name in authors if name in unfollowed],
+        'unchanged': [
+            name for name in dict.fromkeys(usernames)
+            if name not in unfollowed and name not in missing
+        ],
+        'missing': missing,
+    }
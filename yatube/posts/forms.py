@@ -1,13 +1,57 @@
 from django import forms
+from django.conf import settings
+from django.template.defaultfilters import filesizeformat
 from django.utils.translation import gettext_lazy as _
+from PIL import Image
 
 from .models import Post, Comment
 
 
+class PostImageField(forms.ImageField):
+    """Проверяет размер файла и число пикселей до декодирования.
+
+    Pillow читает только заголовок, поэтому огромная картинка
+    отклоняется, не попадая в память целиком.
+    """
+
+    def to_python(self, data):
+        if data in self.empty_values:
+            return None
+        if (getattr(data, 'too_large', False)
+                or data.size > settings.POST_IMAGE_MAX_SIZE):
+            raise forms.ValidationError(
+                'Файл больше %s' % filesizeformat(
+                    settings.POST_IMAGE_MAX_SIZE
+                )
+            )
+        file = (
+            data.temporary_file_path()
+            if hasattr(data, 'temporary_file_path') else data
+        )
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except Exception:
+            raise forms.ValidationError(
+                self.error_messages['invalid_image'], code='invalid_image'
+            )
+        finally:
+            if hasattr(data, 'seek'):
+                data.seek(0)
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                f'Слишком большая картинка: {width}×{height}'
+            )
+        return super().to_python(data)
+
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ('text', 'group', 'image')
+        field_classes = {
+            'image': PostImageField,
+        }
         labels = {
             'text': _('Текст поста'),
             'group': 'Группа',
@@ -19,6 +63,12 @@ class PostForm(forms.ModelForm):
             raise forms.ValidationError('Введите текст поста')
         return data
 
+    def save(self, commit=True):
+        if 'image' in self.changed_data:
+            # Старые миниатюры больше не подходят, новые нарежет фон
+            self.instance.image_renditions = ''
+        return super().save(commit)
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
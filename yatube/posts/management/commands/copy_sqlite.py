@@ -0,0 +1,127 @@
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max, Min
+
+from posts import partitions
+from posts.models import Post
+
+SOURCE = 'sqlite_source'
+
+
+def copied_models():
+    """Все таблицы моделей, включая связи многие-ко-многим.
+
+    Порядок не важен: копирование идёт одной транзакцией, а внешние
+    ключи Django проверяются при её завершении.
+    """
+    return [
+        model for model in apps.get_models(include_auto_created=True)
+        if model._meta.managed and not model._meta.proxy
+    ]
+
+
+def copy_table(model, source, target, batch_size):
+    """Копирует строки как есть: без сигналов, save() и auto_now."""
+    fields = model._meta.concrete_fields
+    quote = target.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    rows = model._base_manager.using(source.alias).order_by('pk').values_list(
+        *(field.attname for field in fields)
+    )
+    batch = []
+    copied = 0
+    with target.cursor() as cursor:
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append([
+                field.get_db_prep_save(value, connection=target)
+                for field, value in zip(fields, row)
+            ])
+            if len(batch) == batch_size:
+                cursor.executemany(sql, batch)
+                copied += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            copied += len(batch)
+    return copied
+
+
+class Command(BaseCommand):
+    help = 'Переносит все данные из файла SQLite в базу --database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'db.sqlite3'),
+            help='Файл SQLite со всеми применёнными миграциями',
+        )
+        parser.add_argument(
+            '--database',
+            default=DEFAULT_DB_ALIAS,
+            help='Куда копировать; данные в ней будут удалены',
+        )
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if not os.path.isfile(options['path']):
+            raise CommandError(f'Нет файла {options["path"]}')
+        connections.databases[SOURCE] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': options['path'],
+        }
+        connections.ensure_defaults(SOURCE)
+        connections.prepare_test_settings(SOURCE)
+        source = connections[SOURCE]
+        target = connections[options['database']]
+        try:
+            self.copy(source, target, options['batch_size'])
+        finally:
+            source.close()
+            del connections[SOURCE]
+            del connections.databases[SOURCE]
+
+    def copy(self, source, target, batch_size):
+        models = copied_models()
+        existing = set(source.introspection.table_names())
+        missing = [
+            model._meta.db_table for model in models
+            if model._meta.db_table not in existing
+        ]
+        if missing:
+            raise CommandError(
+                f'В исходной базе нет таблиц {", ".join(missing)}: '
+                'сначала примените к ней миграции'
+            )
+        # Таблицы очищаются без post_migrate: типы содержимого и права
+        # придут из исходной базы со своими id
+        call_command(
+            'flush', database=target.alias, interactive=False,
+            inhibit_post_migrate=True, verbosity=0,
+        )
+        with transaction.atomic(using=target.alias):
+            if partitions.is_partitioned(target):
+                dates = Post.objects.using(source.alias).aggregate(
+                    first=Min('pub_date'), last=Max('pub_date')
+                )
+                if dates['first'] is not None:
+                    partitions.create_partitions(
+                        target, dates['first'], dates['last']
+                    )
+            for model in models:
+                copied = copy_table(model, source, target, batch_size)
+                self.stdout.write(f'{model._meta.label}: {copied}')
+            with target.cursor() as cursor:
+                for sql in target.ops.sequence_reset_sql(no_style(), models):
+                    cursor.execute(sql)
+        self.stdout.write(self.style.SUCCESS('Данные перенесены'))
@@ -0,0 +1,33 @@
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import export_posts
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии и подписки в JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл JSONL; по умолчанию стандартный вывод',
+        )
+        parser.add_argument(
+            '--images', help='Куда записать tar с картинками постов',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            output = self.stdout
+            if options['output'] != '-':
+                output = stack.enter_context(
+                    open(options['output'], 'w', encoding='utf-8')
+                )
+            images = None
+            if options['images']:
+                images = stack.enter_context(open(options['images'], 'wb'))
+            counts = export_posts(output, images, options['batch_size'])
+        summary = ', '.join(f'{kind}: {n}' for kind, n in counts.items())
+        self.stderr.write(f'Выгружено {summary}')
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.renditions import generate_renditions
+
+
+class Command(BaseCommand):
+    help = 'Нарезает миниатюры для постов, у которых их ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Перенарезать миниатюры у всех постов с картинками',
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='')
+        if not options['all']:
+            posts = posts.filter(image_renditions='')
+        done = 0
+        for post_id in posts.values_list('pk', flat=True).iterator():
+            generate_renditions(post_id)
+            done += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано постов: {done}'))
@@ -0,0 +1,35 @@
+import sys
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.transfer import import_posts
+
+
+class Command(BaseCommand):
+    help = 'Загружает выгрузку export_posts; посты получают новые id'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл JSONL; по умолчанию стандартный ввод',
+        )
+        parser.add_argument('--images', help='tar с картинками постов')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        with ExitStack() as stack:
+            lines = sys.stdin
+            if options['path'] != '-':
+                lines = stack.enter_context(
+                    open(options['path'], encoding='utf-8')
+                )
+            images = None
+            if options['images']:
+                images = stack.enter_context(open(options['images'], 'rb'))
+            try:
+                counts = import_posts(lines, images, options['batch_size'])
+            except ValueError as error:
+                raise CommandError(error)
+        summary = ', '.join(f'{kind}: {n}' for kind, n in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Загружено {summary}'))
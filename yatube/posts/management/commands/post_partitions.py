@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from posts import partitions
+
+
+class Command(BaseCommand):
+    help = 'Создаёт секции таблицы постов на ближайшие месяцы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months',
+            type=int,
+            default=partitions.MONTHS_AHEAD,
+            help='На сколько месяцев вперёд',
+        )
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if not partitions.is_partitioned(connection):
+            raise CommandError('Таблица постов не секционирована')
+        now = timezone.now()
+        last = partitions.add_months(
+            partitions.month_start(now), options['months']
+        )
+        partitions.create_partitions(connection, now, last)
+        self.stdout.write(self.style.SUCCESS(
+            f'Секции готовы до {last:%Y-%m}'
+        ))
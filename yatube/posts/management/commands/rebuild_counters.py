@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.counters import find_inconsistencies, rebuild_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и комментариев'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только проверить счётчики, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            rebuild_counters()
+            self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
+            return
+        problems = find_inconsistencies()
+        for kind, pk, field, stored, actual in problems:
+            self.stdout.write(
+                f'{kind} {pk}: {field} = {stored}, ожидалось {actual}'
+            )
+        if problems:
+            raise CommandError(f'Расхождений в счётчиках: {len(problems)}')
+        self.stdout.write(self.style.SUCCESS('Счётчики согласованы'))
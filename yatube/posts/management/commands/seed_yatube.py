@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими пользователями, постами и подписками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=int, default=20000,
+            help='Примерное общее число подписок',
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Зерно генератора: одно зерно даёт одни и те же данные',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней разбросать даты публикаций',
+        )
+        parser.add_argument(
+            '--zipf', type=float, default=1.1,
+            help='Показатель степени в распределении популярности авторов',
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=0.1,
+            help='Доля постов с картинкой',
+        )
+        parser.add_argument(
+            '--no-index',
+            action='store_true',
+            help='Не перестраивать поисковый индекс',
+        )
+
+    def handle(self, *args, **options):
+        if options['posts'] and not options['users']:
+            raise CommandError('Посты некому писать: задайте --users')
+        seeder = Seeder(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            days=options['days'],
+            zipf=options['zipf'],
+            image_share=options['image_share'],
+            log=self.stdout.write,
+        )
+        seeder.run(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            index=not options['no_index'],
+        )
+        self.stdout.write(self.style.SUCCESS('Данные созданы'))
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:42
+
+from django.db import migrations, models
+import django.db.models.expressions
+
+
+def remove_duplicates(apps, schema_editor):
+    """Перед ограничениями убираем самоподписки и повторы подписок
+    и заново считаем счётчики подписок."""
+    Follow = apps.get_model('posts', 'Follow')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    UserStats = apps.get_model('posts', 'UserStats')
+    Follow.objects.filter(user=models.F('author')).delete()
+    TimelineEntry.objects.filter(user=models.F('author')).delete()
+    first = Follow.objects.order_by().values('user', 'author').annotate(
+        first=models.Min('pk')
+    ).values('first')
+    Follow.objects.exclude(pk__in=first).delete()
+    UserStats.objects.update(followers_count=0, following_count=0)
+    for side, field in (('author', 'followers_count'),
+                        ('user', 'following_count')):
+        counts = Follow.objects.order_by().values(side).annotate(
+            total=models.Count('pk')
+        )
+        for row in counts:
+            UserStats.objects.update_or_create(
+                user_id=row[side], defaults={field: row['total']}
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='posts_follo_user_id_13f95c_idx',
+        ),
+        migrations.AddField(
+            model_name='userstats',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество подписок'),
+        ),
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='no_self_follow'),
+        ),
+    ]
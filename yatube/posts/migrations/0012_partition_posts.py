@@ -0,0 +1,93 @@
+from datetime import datetime, timezone
+
+from django.db import migrations
+from django.utils import timezone as django_timezone
+
+# SQL собран здесь, а не взят из posts/partitions.py: миграция не должна
+# меняться вместе с кодом приложения
+TABLE = 'posts_post'
+MONTHS_AHEAD = 3
+
+
+def month_start(value):
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def next_month(start, months=1):
+    month = start.month - 1 + months
+    return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+
+
+def partition_posts(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    quote = connection.ops.quote_name
+    now = django_timezone.now()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT indexdef FROM pg_indexes WHERE schemaname = '
+            'current_schema() AND tablename = %s AND indexname <> %s',
+            [TABLE, f'{TABLE}_pkey'],
+        )
+        indexes = [row[0] for row in cursor.fetchall()]
+        cursor.execute(f'SELECT min(pub_date) FROM {TABLE}')
+        first = cursor.fetchone()[0] or now
+        for statement in (
+            f'ALTER TABLE {TABLE} RENAME TO {TABLE}_old',
+            # Индексы пересоздаются ниже на всей таблице, а CHECK
+            # и значения по умолчанию переносятся отсюда
+            f'CREATE TABLE {TABLE} (LIKE {TABLE}_old '
+            'INCLUDING ALL EXCLUDING INDEXES) PARTITION BY RANGE (pub_date)',
+            # Иначе последовательность id удалится вместе со старой таблицей
+            f'ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id',
+            f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, pub_date)',
+            f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_author_id_fk '
+            'FOREIGN KEY (author_id) REFERENCES auth_user (id) '
+            'DEFERRABLE INITIALLY DEFERRED',
+            f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_group_id_fk '
+            'FOREIGN KEY (group_id) REFERENCES posts_group (id) '
+            'DEFERRABLE INITIALLY DEFERRED',
+            f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT',
+        ):
+            cursor.execute(statement)
+        last = next_month(month_start(now), MONTHS_AHEAD)
+        start = month_start(first)
+        while start <= last:
+            cursor.execute(
+                f'CREATE TABLE {quote(f"{TABLE}_{start:%Y_%m}")} '
+                f'PARTITION OF {TABLE} FOR VALUES FROM (%s) TO (%s)',
+                [start, next_month(start)],
+            )
+            start = next_month(start)
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_old')
+        # Первичный ключ теперь (id, pub_date), и внешний ключ на один id
+        # больше не на что повесить. Ключи на старую таблицу снимаются
+        # поимённо: DROP ... CASCADE молча убрал бы всё, что от неё
+        # зависит. На SQLite и несекционированной таблице они остаются
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND confrelid = %s::regclass",
+            [f'{TABLE}_old'],
+        )
+        for table, constraint in cursor.fetchall():
+            cursor.execute(
+                f'ALTER TABLE {table} DROP CONSTRAINT {quote(constraint)}'
+            )
+        cursor.execute(f'DROP TABLE {TABLE}_old')
+        # Индекс на секционированной таблице создаётся во всех секциях
+        for index in indexes:
+            cursor.execute(index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_follow_constraints'),
+    ]
+
+    operations = [
+        # Обратно таблица не собирается: Django работает с ней так же
+        migrations.RunPython(partition_posts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+def fill_frequencies(apps, schema_editor):
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    SearchFrequency = apps.get_model('posts', 'SearchFrequency')
+    documents = SearchTerm.objects.values('post', 'comment').distinct()
+    terms = SearchTerm.objects.order_by().values_list('term').annotate(
+        total=models.Count('pk')
+    )
+    SearchFrequency.objects.bulk_create(
+        [SearchFrequency(term='', documents=documents.count())]
+        + [SearchFrequency(term=term, documents=total)
+           for term, total in terms],
+        batch_size=500,
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_timeline_post_order'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchFrequency',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, unique=True, verbose_name='Слово')),
+                ('documents', models.PositiveIntegerField(verbose_name='Число документов')),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='searchterm',
+            name='posts_searc_term_27a9f7_idx',
+        ),
+        migrations.AddIndex(
+            model_name='searchterm',
+            index=models.Index(fields=['term', 'post'], name='posts_searc_term_27a9f7_idx', opclasses=['varchar_pattern_ops', 'int4_ops']),
+        ),
+        migrations.RunPython(fill_frequencies, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+import json
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
@@ -15,6 +17,22 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Посты для лент: автор и группа одним запросом, без лишних полей."""
+        return self.select_related('author', 'group').only(
+            'text',
+            'pub_date',
+            'image',
+            'image_renditions',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group__slug',
+            'group__title',
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         verbose_name='Пост',
@@ -44,13 +62,40 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        verbose_name='Количество комментариев',
+        default=0,
+        editable=False,
+    )
+    # Готовые миниатюры картинки в JSON: {название: url}
+    image_renditions = models.TextField(
+        verbose_name='Миниатюры картинки',
+        blank=True,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        # Под ленты: общую, группы и автора с keyset-пагинацией
+        indexes = [
+            models.Index(fields=['-pub_date', '-id']),
+            models.Index(fields=['group', '-pub_date', '-id']),
+            models.Index(fields=['author', '-pub_date', '-id']),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def renditions(self):
+        try:
+            renditions = json.loads(self.image_renditions or '{}')
+        except ValueError:
+            return {}
+        return renditions if isinstance(renditions, dict) else {}
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -77,6 +122,11 @@ class Comment(models.Model):
         auto_now_add=True,
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created']),
+        ]
+
     def __str__(self):
         return self.text[:15]
 
@@ -94,3 +144,135 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Автор',
     )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='no_self_follow',
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField(
+        verbose_name='Количество постов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Количество подписчиков',
+        default=0,
+    )
+    following_count = models.PositiveIntegerField(
+        verbose_name='Количество подписок',
+        default=0,
+    )
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class TimelineEntry(models.Model):
+    """Пост в материализованной ленте подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        ordering = ['-pub_date']
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-post']),
+            models.Index(fields=['user', 'author']),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class SearchTerm(models.Model):
+    """Запись обратного индекса: слово и пост (или комментарий к нему)."""
+    term = models.CharField(
+        verbose_name='Слово',
+        max_length=64,
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Пост',
+    )
+    comment = models.ForeignKey(
+        Comment,
+        blank=True,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Комментарий',
+    )
+    frequency = models.PositiveIntegerField(
+        verbose_name='Число вхождений',
+    )
+
+    class Meta:
+        indexes = [
+            # varchar_pattern_ops нужен PostgreSQL для поиска по префиксу
+            # (LIKE 'слово%') при любой локали; SQLite классы не учитывает
+            models.Index(
+                fields=['term', 'post'],
+                name='posts_searc_term_27a9f7_idx',
+                opclasses=['varchar_pattern_ops', 'int4_ops'],
+            ),
+        ]
+
+    def __str__(self):
+        return self.term
+
+
+class SearchFrequency(models.Model):
+    """Сколько документов (постов и комментариев) содержит слово.
+
+    Считается заново при перестройке индекса, между перестройками
+    веса слов в выдаче не меняются. Запись с пустым словом хранит
+    число всех документов.
+    """
+    term = models.CharField(
+        verbose_name='Слово',
+        max_length=64,
+        unique=True,
+    )
+    documents = models.PositiveIntegerField(
+        verbose_name='Число документов',
+    )
+
+    def __str__(self):
+        return f'{self.term}: {self.documents}'
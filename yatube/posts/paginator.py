@@ -0,0 +1,182 @@
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.metrics import PAGINATOR_DEPTH
+
+NEXT = 'n'
+PREVIOUS = 'p'
+# Сколько раз окно по дате удваивается, прежде чем снять границу
+WINDOW_STEPS = 4
+# id и номер страницы из курсора должны влезать в BIGINT
+MAX_INT = 2 ** 63 - 1
+
+
+class CursorPage(Page):
+    """Страница ленты, построенная по курсору вместо номера."""
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None, number=1):
+        super().__init__(object_list, number, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage of %s items>' % len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по паре (дата, id) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы одинакова: запрос всегда выбирает
+    per_page + 1 строк после (или до) позиции из курсора. Номер
+    страницы курсор несёт только для статистики глубины листания.
+    По умолчанию первыми идут новые записи, descending=False - старые.
+    key - поле, по которому упорядочены записи с одной датой,
+    name - метка пагинатора в метрике глубины листания.
+
+    С window (timedelta) строки выбираются окнами по дате от позиции
+    курсора, каждое следующее вдвое шире: у таблицы, секционированной
+    по дате, запрос с обеими границами трогает одну-две секции.
+    """
+
+    def __init__(self, object_list, per_page, date_field='pub_date',
+                 descending=True, window=None, key='pk', name='posts'):
+        super().__init__(object_list, per_page)
+        self.name = name
+        self.date_field = date_field
+        self.key = key
+        self.descending = descending
+        self.window = window
+
+    def _check_object_list_is_ordered(self):
+        # Порядок задаёт сам пагинатор в build_page
+        pass
+
+    def walks_back(self, direction):
+        """Идёт ли выборка в сторону меньших дат."""
+        return (direction == NEXT) == self.descending
+
+    def encode_cursor(self, direction, obj, number):
+        value = '|'.join((
+            direction,
+            getattr(obj, self.date_field).isoformat(),
+            str(getattr(obj, self.key)),
+            str(number),
+        ))
+        return base64.urlsafe_b64encode(value.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        try:
+            value = base64.urlsafe_b64decode(cursor.encode()).decode()
+            direction, date, pk, number = value.split('|')
+            date = parse_datetime(date)
+            pk = int(pk)
+            number = max(int(number), 1)
+        except (binascii.Error, UnicodeError, ValueError):
+            return None
+        if (direction not in (NEXT, PREVIOUS) or date is None
+                or timezone.is_naive(date)
+                or not -MAX_INT <= pk <= MAX_INT or number > MAX_INT):
+            return None
+        return direction, date, pk, number
+
+    def get_page(self, cursor=None):
+        page = self.find_page(cursor)
+        PAGINATOR_DEPTH.observe(page.number, paginator=self.name)
+        return page
+
+    def find_page(self, cursor):
+        position = self.decode_cursor(cursor) if cursor else None
+        if position is None:
+            # Первая страница новых записей отсчитывается от текущего
+            # времени, у старых записей начала окна нет
+            anchor = timezone.now() if self.descending else None
+            return self.build_page(self.object_list, NEXT, 1, anchor)
+        direction, date, pk, number = position
+        field = self.date_field
+        # Условие на дату вынесено отдельно, чтобы SQLite шёл по индексу
+        # диапазоном, а не разбирал OR просмотром всей таблицы.
+        if self.walks_back(direction):
+            rows = self.object_list.filter(
+                Q(**{f'{field}__lte': date}),
+                Q(**{f'{field}__lt': date}) | Q(**{f'{self.key}__lt': pk}),
+            )
+        else:
+            rows = self.object_list.filter(
+                Q(**{f'{field}__gte': date}),
+                Q(**{f'{field}__gt': date}) | Q(**{f'{self.key}__gt': pk}),
+            )
+        return self.build_page(rows, direction, number, date)
+
+    def fetch(self, rows, direction, anchor):
+        """Первые per_page + 1 строк, при window - по окнам от anchor."""
+        limit = self.per_page + 1
+        if self.window is None or anchor is None:
+            return list(rows[:limit])
+        field = self.date_field
+        back = self.walks_back(direction)
+        # Ближняя граница окна включается, дальняя нет
+        near, far = ('lt', 'gte') if back else ('gte', 'lt')
+        items = []
+        edge = None
+        span = self.window
+        for step in range(WINDOW_STEPS + 1):
+            window = rows
+            if edge is not None:
+                window = window.filter(**{f'{field}__{near}': edge})
+            last = step == WINDOW_STEPS
+            if not last:
+                try:
+                    edge = anchor - span if back else anchor + span
+                except OverflowError:
+                    # Окно упёрлось в край дат: дальше без границы
+                    last = True
+                else:
+                    window = window.filter(**{f'{field}__{far}': edge})
+                    span *= 2
+            items += window[:limit - len(items)]
+            if len(items) == limit or last:
+                break
+        return items
+
+    def build_page(self, rows, direction, number, anchor=None):
+        field = self.date_field
+        if self.walks_back(direction):
+            rows = rows.order_by(f'-{field}', f'-{self.key}')
+        else:
+            rows = rows.order_by(field, self.key)
+        items = self.fetch(rows, direction, anchor)
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if direction == PREVIOUS:
+            items.reverse()
+        if not items:
+            return CursorPage(items, self, number=number)
+        if direction == NEXT:
+            has_next, has_previous = has_more, number > 1
+        else:
+            has_next, has_previous = True, has_more
+        return CursorPage(
+            items,
+            self,
+            next_cursor=(
+                self.encode_cursor(NEXT, items[-1], number + 1)
+                if has_next else None
+            ),
+            previous_cursor=(
+                self.encode_cursor(PREVIOUS, items[0], number - 1)
+                if has_previous else None
+            ),
+            number=number,
+        )
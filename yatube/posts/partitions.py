@@ -0,0 +1,66 @@
+"""Секционирование таблицы постов по месяцам pub_date в PostgreSQL.
+
+Миграция 0012 превращает posts_post в секционированную таблицу с
+секцией на каждый месяц от первого поста до MONTHS_AHEAD месяцев
+вперёд и секцией по умолчанию для дат вне готовых диапазонов.
+Первичный ключ становится (id, pub_date): ключ секционирования
+обязан в него входить, а внешний ключ может ссылаться только на
+уникальные столбцы. Поэтому та же миграция снимает внешние ключи
+на посты из комментариев, ленты подписок и поиска, удаление за них
+делает Django (on_delete). В SQLite и в несекционированной таблице
+PostgreSQL ключи остаются.
+
+Секции на будущие месяцы заранее создаёт manage.py post_partitions.
+На SQLite таблица остаётся обычной.
+"""
+from datetime import datetime, timezone
+
+TABLE = 'posts_post'
+# Сколько месяцев вперёд держать готовые секции
+MONTHS_AHEAD = 3
+
+
+def is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table '
+            'WHERE partrelid = %s::regclass', [TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def month_start(value):
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(start, months):
+    """Начало месяца через months месяцев от начала месяца start."""
+    month = start.month - 1 + months
+    return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+
+
+def months(first, last):
+    """Начала месяцев с first по last включительно."""
+    start = month_start(first)
+    while start <= last:
+        yield start
+        start = add_months(start, 1)
+
+
+def partition_name(start):
+    return f'{TABLE}_{start:%Y_%m}'
+
+
+def create_partitions(connection, first, last):
+    """Секции на месяцы от first до last; уже созданные пропускаются."""
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        for start in months(first, last):
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {quote(partition_name(start))} '
+                f'PARTITION OF {quote(TABLE)} FOR VALUES FROM (%s) TO (%s)',
+                [start, add_months(start, 1)],
+            )
@@ -0,0 +1,134 @@
+import json
+import logging
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+from sorl.thumbnail import get_thumbnail
+
+from core.metrics import THUMBNAIL_SECONDS
+
+from . import background, caching
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+}
+
+
+def build_rendition(image, config):
+    """Режет картинку во всех ширинах и форматах миниатюры.
+
+    Возвращает готовые строки srcset по MIME-типам и src запасного
+    формата в базовой ширине.
+    """
+    base_width, base_height = map(int, config['geometry'].split('x'))
+    options = {
+        'crop': config.get('crop'),
+        'upscale': config.get('upscale', False),
+    }
+    sources = {}
+    src = None
+    for image_format in config['formats']:
+        candidates = {}
+        for width in config['widths']:
+            height = round(width * base_height / base_width)
+            thumbnail = get_thumbnail(
+                image, f'{width}x{height}', format=image_format, **options
+            )
+            candidates[thumbnail.width] = thumbnail.url
+            if width == base_width:
+                src = thumbnail.url
+        sources[MIME_TYPES[image_format]] = ', '.join(
+            f'{url} {width}w' for width, url in sorted(candidates.items())
+        )
+    fallback = candidates[max(candidates)]
+    return {'src': src or fallback, 'sources': sources}
+
+
+EXIF_ORIENTATION = 0x0112
+
+
+def normalize_image(post):
+    """Поворачивает картинку по EXIF-ориентации.
+
+    Перекодируется только повёрнутая картинка, при этом EXIF из файла
+    пропадает; остальные файлы не трогаются, чтобы не терять качество.
+    Выполняется в фоновом пуле: здесь картинка декодируется целиком.
+    Новый файл пишется рядом, старый удаляется после обновления поста.
+    Возвращает True, если картинка заменена.
+    """
+    with post.image.open('rb') as file, Image.open(file) as image:
+        if image.getexif().get(EXIF_ORIENTATION, 1) == 1:
+            return False
+        image_format = image.format
+        content = BytesIO()
+        ImageOps.exif_transpose(image).save(
+            content, format=image_format, quality=95
+        )
+    storage = post.image.storage
+    name = post.image.name
+    new_name = storage.save(name, ContentFile(content.getvalue()))
+    if not Post.objects.filter(pk=post.pk, image=name).update(image=new_name):
+        # Картинку успели заменить, повёрнутая копия не нужна
+        storage.delete(new_name)
+        return False
+    storage.delete(name)
+    post.image.name = new_name
+    return True
+
+
+def generate_renditions(post_id):
+    """Нарезает все миниатюры из THUMBNAIL_RENDITIONS и сохраняет
+    их адреса в посте, чтобы шаблоны не обращались к sorl."""
+    post = Post.objects.select_related('author', 'group').filter(
+        pk=post_id
+    ).first()
+    if post is None or not post.image:
+        return {}
+    start = time.perf_counter()
+    normalize_image(post)
+    renditions = {
+        name: build_rendition(post.image, config)
+        for name, config in settings.THUMBNAIL_RENDITIONS.items()
+    }
+    THUMBNAIL_SECONDS.observe(time.perf_counter() - start)
+    Post.objects.filter(pk=post_id, image=post.image.name).update(
+        image_renditions=json.dumps(renditions)
+    )
+    caching.bump(*caching.post_scopes(post))
+    return renditions
+
+
+def generate_missing(posts):
+    """Нарезает миниатюры постам из posts, у которых их ещё нет.
+
+    Ошибка в одной картинке не останавливает остальные. Возвращает
+    число обработанных постов.
+    """
+    posts = posts.exclude(image='').filter(image_renditions='')
+    done = 0
+    for post_id in posts.values_list('pk', flat=True).iterator():
+        try:
+            generate_renditions(post_id)
+        except Exception:
+            logger.exception('Не удалось нарезать миниатюры поста %s', post_id)
+            continue
+        done += 1
+    return done
+
+
+def schedule_renditions(post):
+    """Ставит нарезку миниатюр в фоновый пул после коммита транзакции."""
+    if not post.image:
+        return
+    if not settings.THUMBNAIL_ASYNC:
+        generate_renditions(post.pk)
+        return
+    background.submit(generate_renditions, post.pk)
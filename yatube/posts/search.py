@@ -0,0 +1,396 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Если SQLite собран с FTS5, индекс живёт в виртуальной таблице
+posts_search и ранжируется по bm25. Иначе используется обратный
+индекс в таблице SearchTerm, который строится на Python.
+Слова запроса ищутся как префиксы: «туман» найдёт и «тумане».
+Документ - пост или комментарий, и все слова запроса должны найтись
+в одном документе. Оба варианта выдают пары (score, post_id) по
+лучшему документу поста: чем больше score, тем выше пост в выдаче.
+"""
+import base64
+import binascii
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import (
+    Case, Count, ExpressionWrapper, F, FloatField, IntegerField, Max, Q, Sum,
+    Value, When,
+)
+from django.db.models.expressions import RawSQL
+
+from .models import Comment, Post, SearchFrequency, SearchTerm
+from .paginator import MAX_INT, NEXT, PREVIOUS, CursorPage
+
+FTS_TABLE = 'posts_search'
+WORD_RE = re.compile(r'\w+')
+MAX_TERM_LENGTH = 64
+BATCH_SIZE = 500
+# Слово записи SearchFrequency с числом всех документов
+ALL_DOCUMENTS = ''
+
+
+def tokenize(text):
+    return [
+        word[:MAX_TERM_LENGTH]
+        for word in WORD_RE.findall(text.lower().replace('ё', 'е'))
+    ]
+
+
+# Есть ли таблица FTS5, по имени базы: проверяется один раз на процесс
+_fts_tables = {}
+
+
+def fts_available():
+    if connection.vendor != 'sqlite':
+        return False
+    name = connection.settings_dict['NAME']
+    if name not in _fts_tables:
+        with connection.cursor() as cursor:
+            _fts_tables[name] = (
+                FTS_TABLE in connection.introspection.table_names(cursor)
+            )
+    return _fts_tables[name]
+
+
+def _rowid(kind, pk):
+    # У постов чётные rowid, у комментариев нечётные: удаление по rowid
+    # не требует полного просмотра виртуальной таблицы.
+    return pk * 2 + (kind == 'comment')
+
+
+class InSubquery(RawSQL):
+    """Сырой подзапрос для pk__in. Скобки вокруг него ставит сам
+    lookup; вторые, от RawSQL, SQLite прочитал бы как скаляр."""
+
+    def as_sql(self, compiler, connection):
+        return self.sql, self.params
+
+
+class FtsBackend:
+    def index(self, kind, pk, post_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [_rowid(kind, pk)],
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, text, post_id) '
+                f'VALUES (%s, %s, %s)',
+                [_rowid(kind, pk), ' '.join(tokenize(text)), post_id],
+            )
+
+    def remove(self, kind, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [_rowid(kind, pk)],
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+
+    def match(self, terms):
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def matching(self, terms):
+        return InSubquery(
+            f'SELECT post_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            [self.match(terms)],
+        )
+
+    def weights(self, terms):
+        # bm25 сам берёт статистику из индекса
+        return None
+
+    def scores(self, terms, weights):
+        # bm25 нельзя звать внутри агрегата, поэтому сначала считаем его
+        # во вложенном запросе; LIMIT -1 не даёт SQLite его развернуть.
+        return (
+            f'SELECT -MIN(rank) AS score, post_id FROM ('
+            f'SELECT bm25({FTS_TABLE}) AS rank, post_id FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s LIMIT -1'
+            f') AS documents GROUP BY post_id'
+        ), [self.match(terms)]
+
+    def update_frequencies(self):
+        pass
+
+
+class PythonBackend:
+    def _filter(self, kind, pk):
+        if kind == 'comment':
+            return SearchTerm.objects.filter(comment_id=pk)
+        return SearchTerm.objects.filter(post_id=pk, comment=None)
+
+    def index(self, kind, pk, post_id, text):
+        self.remove(kind, pk)
+        SearchTerm.objects.bulk_create(
+            (
+                SearchTerm(
+                    term=term,
+                    post_id=post_id,
+                    comment_id=pk if kind == 'comment' else None,
+                    frequency=frequency,
+                )
+                for term, frequency in Counter(tokenize(text)).items()
+            ),
+            batch_size=BATCH_SIZE,
+        )
+
+    def remove(self, kind, pk):
+        self._filter(kind, pk).delete()
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    def _documents(self, terms, **annotations):
+        """Документы, где есть все слова запроса: как и в FTS, слова
+        поста и его комментариев не складываются."""
+        prefixes = Q()
+        for term in terms:
+            prefixes |= Q(term__startswith=term)
+        # По флагу на слово: у документа должны найтись все слова
+        matches = {
+            f'match_{i}': Max(Case(
+                When(term__startswith=term, then=Value(1)),
+                default=Value(0),
+                output_field=IntegerField(),
+            ))
+            for i, term in enumerate(terms)
+        }
+        return (
+            SearchTerm.objects.filter(prefixes).order_by()
+            .values('post_id', 'comment_id')
+            .annotate(**annotations, **matches)
+            .filter(**{name: 1 for name in matches})
+        )
+
+    def matching(self, terms):
+        sql, params = self._documents(terms).query.sql_with_params()
+        return InSubquery(
+            f'SELECT post_id FROM ({sql}) AS documents', params
+        )
+
+    def weights(self, terms):
+        """idf слов запроса по частотам с последней перестройки индекса.
+        Слово, которого тогда не было, считается редким."""
+        totals = SearchFrequency.objects.aggregate(
+            total=Sum(Case(
+                When(term=ALL_DOCUMENTS, then=F('documents')),
+                output_field=IntegerField(),
+            )),
+            **{
+                f'term_{i}': Sum(Case(
+                    When(term__startswith=term, then=F('documents')),
+                    output_field=IntegerField(),
+                ))
+                for i, term in enumerate(terms)
+            },
+        )
+        documents = max(totals['total'] or 0, 1)
+        return [
+            math.log(1 + documents / max(totals[f'term_{i}'] or 0, 1))
+            for i in range(len(terms))
+        ]
+
+    def scores(self, terms, weights):
+        score = Sum(Case(
+            *(
+                When(term__startswith=term, then=ExpressionWrapper(
+                    F('frequency') * Value(weight), output_field=FloatField(),
+                ))
+                for term, weight in zip(terms, weights)
+            ),
+            output_field=FloatField(),
+        ))
+        sql, params = self._documents(
+            terms, score=score
+        ).query.sql_with_params()
+        return (
+            f'SELECT MAX(score) AS score, post_id FROM ({sql}) AS documents '
+            f'GROUP BY post_id'
+        ), list(params)
+
+    def update_frequencies(self):
+        SearchFrequency.objects.all().delete()
+        documents = SearchTerm.objects.values('post_id', 'comment_id')
+        terms = SearchTerm.objects.order_by().values_list('term').annotate(
+            total=Count('pk')
+        )
+        SearchFrequency.objects.bulk_create(
+            [SearchFrequency(
+                term=ALL_DOCUMENTS, documents=documents.distinct().count()
+            )]
+            + [SearchFrequency(term=term, documents=total)
+               for term, total in terms.iterator()],
+            batch_size=BATCH_SIZE,
+        )
+
+
+def ranked(backend, terms, weights, position=None, limit=None):
+    """Пары (score, post_id) по убыванию score. position - (направление,
+    score, post_id) строки, после или до которой начинается выборка."""
+    sql, params = backend.scores(terms, weights)
+    sql = f'SELECT score, post_id FROM ({sql}) AS posts'
+    order = 'score DESC, post_id'
+    if position is not None:
+        direction, score, post_id = position
+        if direction == NEXT:
+            sql += ' WHERE score < %s OR (score = %s AND post_id > %s)'
+        else:
+            sql += ' WHERE score > %s OR (score = %s AND post_id < %s)'
+            order = 'score, post_id DESC'
+        params += [score, score, post_id]
+    sql += f' ORDER BY {order}'
+    if limit is not None:
+        sql += ' LIMIT %s'
+        params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(score, int(post_id)) for score, post_id in cursor]
+
+
+def get_backend():
+    if settings.SEARCH_BACKEND == 'python' or not fts_available():
+        return PythonBackend()
+    return FtsBackend()
+
+
+def index_post(post):
+    get_backend().index('post', post.pk, post.pk, post.text)
+
+
+def index_comment(comment):
+    if comment.post_id is None:
+        remove_comment(comment)
+        return
+    get_backend().index('comment', comment.pk, comment.post_id, comment.text)
+
+
+def remove_post(post):
+    """Убирает пост и комментарии к нему; вызывается до удаления поста,
+    пока комментарии ещё ссылаются на него."""
+    backend = get_backend()
+    backend.remove('post', post.pk)
+    for pk in Comment.objects.filter(post=post).values_list('pk', flat=True):
+        backend.remove('comment', pk)
+
+
+def remove_comment(comment):
+    get_backend().remove('comment', comment.pk)
+
+
+@transaction.atomic
+def rebuild_index():
+    # В одной транзакции: иначе SQLite фиксирует на диск каждую строку
+    backend = get_backend()
+    backend.clear()
+    for pk, text in Post.objects.values_list('pk', 'text').iterator():
+        backend.index('post', pk, pk, text)
+    comments = Comment.objects.exclude(post=None).values_list(
+        'pk', 'post_id', 'text'
+    )
+    for pk, post_id, text in comments.iterator():
+        backend.index('comment', pk, post_id, text)
+    backend.update_frequencies()
+
+
+def query_terms(query):
+    return sorted(set(tokenize(query)))
+
+
+def post_ids(query, limit=None):
+    """id постов по запросу, лучшие совпадения первыми."""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    backend = get_backend()
+    return [
+        post_id for _, post_id
+        in ranked(backend, terms, backend.weights(terms), limit=limit)
+    ]
+
+
+def matching_posts(query):
+    """Подзапрос с id постов, где есть все слова запроса, для
+    filter(pk__in=...): список id в память не собирается."""
+    terms = query_terms(query)
+    if not terms:
+        return []
+    return get_backend().matching(terms)
+
+
+def encode_cursor(direction, score, post_id, weights):
+    value = '|'.join((
+        direction,
+        repr(score),
+        str(post_id),
+        ','.join(map(repr, weights or ())),
+    ))
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        direction, score, post_id, weights = base64.urlsafe_b64decode(
+            cursor.encode()
+        ).decode().split('|')
+        score = float(score)
+        post_id = int(post_id)
+        weights = [float(weight) for weight in weights.split(',') if weight]
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if (direction not in (NEXT, PREVIOUS)
+            or not all(map(math.isfinite, [score, *weights]))
+            or not -MAX_INT <= post_id <= MAX_INT):
+        return None
+    return direction, score, post_id, weights or None
+
+
+def search_page(query, cursor, per_page):
+    """Страница выдачи с keyset-пагинацией по (score, post_id).
+
+    Курсор несёт веса слов, с которыми считалась первая страница:
+    после перестройки индекса score тех же постов меняется, и без
+    них листание перескакивало бы или теряло посты.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return CursorPage([], None)
+    backend = get_backend()
+    position = decode_cursor(cursor) if cursor else None
+    weights = position[3] if position else None
+    if weights is None or len(weights) != len(terms):
+        weights = backend.weights(terms)
+    direction = position[0] if position else NEXT
+    rows = ranked(
+        backend, terms, weights,
+        position=position[:3] if position else None, limit=per_page + 1,
+    )
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == PREVIOUS:
+        rows.reverse()
+    if not rows:
+        return CursorPage([], None)
+    if direction == NEXT:
+        has_next, has_previous = has_more, position is not None
+    else:
+        has_next, has_previous = True, has_more
+    posts = Post.objects.feed().in_bulk([post_id for _, post_id in rows])
+    return CursorPage(
+        [posts[post_id] for _, post_id in rows if post_id in posts],
+        None,
+        next_cursor=(
+            encode_cursor(NEXT, *rows[-1], weights) if has_next else None
+        ),
+        previous_cursor=(
+            encode_cursor(PREVIOUS, *rows[0], weights)
+            if has_previous else None
+        ),
+    )
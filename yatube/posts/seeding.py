@@ -0,0 +1,221 @@
+"""Генератор синтетических данных для нагрузочных проверок.
+
+Строки пишутся через bulk_create пачками и с заранее посчитанными id:
+SQLite не возвращает их из bulk_create. Популярность авторов
+распределена по закону Ципфа, поэтому и посты, и подписчики
+сосредоточены у немногих авторов, как на живом сайте.
+Сигналы при массовой вставке не срабатывают, так что счётчики,
+ленты и поисковый индекс пересобираются в конце.
+"""
+import random
+import time
+from array import array
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from . import caching, renditions, search, timeline
+from .counters import rebuild_counters
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+VOCABULARY_SIZE = 2000
+IMAGE_POOL = 16
+IMAGE_SIZE = (1200, 800)
+GROUP_SHARE = 0.7
+
+
+def insert_as_is(model, objects):
+    """bulk_create, который пишет значения полей как есть.
+
+    Как и loaddata, вставка идёт в режиме raw без pre_save полей:
+    auto_now_add не перетирает готовые даты, а само поле не меняется.
+    У всех объектов id либо задан, либо нет.
+    """
+    objects = list(objects)
+    if not objects:
+        return
+    fields = model._meta.concrete_fields
+    if objects[0].pk is None:
+        fields = [field for field in fields if not field.primary_key]
+    size = max(connection.ops.bulk_batch_size(fields, objects), 1)
+    for start in range(0, len(objects), size):
+        model._base_manager._insert(
+            objects[start:start + size], fields=fields, raw=True
+        )
+
+
+def next_pk(model):
+    return (model.objects.aggregate(top=Max('pk'))['top'] or 0) + 1
+
+
+class Seeder:
+    def __init__(self, seed=0, batch_size=1000, days=365, zipf=1.1,
+                 image_share=0.1, log=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.days = days
+        self.zipf = zipf
+        self.image_share = image_share
+        self.log = log or (lambda message: None)
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        self.vocabulary = fake.words(VOCABULARY_SIZE)
+        self.now = timezone.now()
+
+    def insert(self, model, objects):
+        count = 0
+        started = time.monotonic()
+        with transaction.atomic():
+            for batch in iter(
+                lambda: list(islice(objects, self.batch_size)), []
+            ):
+                insert_as_is(model, batch)
+                count += len(batch)
+        self.log(
+            f'{model._meta.verbose_name_plural}: {count} '
+            f'за {time.monotonic() - started:.1f} с'
+        )
+
+    def text(self, low, high):
+        size = self.rng.randint(low, high)
+        words = self.rng.choices(self.vocabulary, k=size)
+        return ' '.join(words).capitalize() + '.'
+
+    def popular(self, users, k):
+        """k авторов, у ранних id популярность выше по закону Ципфа."""
+        first, count = users
+        return [
+            first + index for index in self.rng.choices(
+                range(count), cum_weights=self.weights, k=k
+            )
+        ]
+
+    def images(self):
+        names = []
+        for i in range(IMAGE_POOL):
+            name = f'posts/seed/{self.seed}-{i}.jpg'
+            if not default_storage.exists(name):
+                color = tuple(self.rng.randrange(256) for _ in range(3))
+                buffer = BytesIO()
+                Image.new('RGB', IMAGE_SIZE, color).save(buffer, 'JPEG')
+                name = default_storage.save(
+                    name, ContentFile(buffer.getvalue())
+                )
+            names.append(name)
+        return names
+
+    def users(self, first, count):
+        for pk in range(first, first + count):
+            yield User(
+                pk=pk,
+                username=f'seed{pk}',
+                first_name=self.rng.choice(self.vocabulary).capitalize(),
+                password=UNUSABLE_PASSWORD_PREFIX,
+            )
+
+    def groups(self, first, count):
+        for pk in range(first, first + count):
+            yield Group(
+                pk=pk,
+                title=self.text(1, 3)[:200],
+                slug=f'seed-group-{pk}',
+                description=self.text(5, 20),
+            )
+
+    def posts(self, first, count, users, groups, dates):
+        images = self.images() if self.image_share else []
+        period = self.days * 24 * 3600
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            authors = self.popular(users, size)
+            for i, author_id in enumerate(authors):
+                age = self.rng.uniform(0, period)
+                dates.append(age)
+                group_id = None
+                if groups[1] and self.rng.random() < GROUP_SHARE:
+                    group_id = groups[0] + self.rng.randrange(groups[1])
+                image = ''
+                if images and self.rng.random() < self.image_share:
+                    image = self.rng.choice(images)
+                yield Post(
+                    pk=first + offset + i,
+                    author_id=author_id,
+                    group_id=group_id,
+                    text=self.text(5, 60),
+                    pub_date=self.now - timedelta(seconds=age),
+                    image=image,
+                )
+
+    def comments(self, count, users, posts, dates):
+        for _ in range(count):
+            index = self.rng.randrange(posts[1])
+            # Комментарий появляется после поста
+            age = self.rng.uniform(0, dates[index])
+            yield Comment(
+                post_id=posts[0] + index,
+                author_id=users[0] + self.rng.randrange(users[1]),
+                text=self.text(2, 30),
+                created=self.now - timedelta(seconds=age),
+            )
+
+    def follows(self, count, users):
+        if users[1] < 2:
+            return
+        mean = count / users[1]
+        for user_id in range(users[0], users[0] + users[1]):
+            k = min(users[1] - 1, round(self.rng.expovariate(1 / mean)))
+            authors = set(self.popular(users, k)) - {user_id}
+            for author_id in sorted(authors):
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    def run(self, users, groups, posts, comments, follows, index=True):
+        user_range = (next_pk(User), users)
+        group_range = (next_pk(Group), groups)
+        post_range = (next_pk(Post), posts)
+        dates = array('d')
+        self.weights = list(accumulate(
+            1 / rank ** self.zipf for rank in range(1, users + 1)
+        ))
+        self.insert(User, self.users(*user_range))
+        self.insert(Group, self.groups(*group_range))
+        self.insert(Post, self.posts(
+            post_range[0], posts, user_range, group_range, dates
+        ))
+        if posts:
+            self.insert(Comment, self.comments(
+                comments, user_range, post_range, dates
+            ))
+        self.insert(Follow, self.follows(follows, user_range))
+        # Явные id не двигают последовательности в PostgreSQL
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [User, Group, Post, Comment]
+            ):
+                cursor.execute(sql)
+        started = time.monotonic()
+        rebuild_counters()
+        timeline.rebuild()
+        if index:
+            search.rebuild_index()
+        renditions.generate_missing(
+            Post.objects.filter(pk__gte=post_range[0])
+        )
+        caching.bump('feed')
+        self.log(
+            f'Счётчики, ленты, индекс и миниатюры '
+            f'за {time.monotonic() - started:.1f} с'
+        )
@@ -0,0 +1,142 @@
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import caching, search, timeline
+from .counters import (
+    bump_post_comments, bump_user_counter, shift_follow_counters
+)
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, **kwargs):
+    # Пост мог сменить группу: старую страницу группы тоже нужно сбросить.
+    old = Post.objects.select_related('author', 'group').filter(
+        pk=instance.pk
+    ).first() if instance.pk else None
+    instance._old_scopes = caching.post_scopes(old) if old else []
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_user_counter(instance.author_id, 'posts_count', 1)
+        timeline.fan_out_post(instance)
+    caching.bump(
+        *getattr(instance, '_old_scopes', []), *caching.post_scopes(instance)
+    )
+    if not created:
+        # Записи лент синдикации перестраиваются только после правок
+        caching.bump('edits')
+    search.index_post(instance)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    search.remove_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_user_counter(instance.author_id, 'posts_count', -1)
+    caching.bump('edits', *caching.post_scopes(instance))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created and instance.post_id:
+        bump_post_comments(instance.post_id, 1)
+    caching.bump(f'comments:{instance.post_id}')
+    search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    if instance.post_id:
+        bump_post_comments(instance.post_id, -1)
+    caching.bump(f'comments:{instance.post_id}')
+    search.remove_comment(instance)
+
+
+def follow_scopes(follow):
+    # Счётчики подписок показываются в профилях обоих пользователей
+    return (
+        f'follows:{follow.user_id}',
+        f'author:{follow.user.username}',
+        f'author:{follow.author.username}',
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        shift_follow_counters(instance.user_id, [instance.author_id], 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+    caching.bump(*follow_scopes(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    followers = shift_follow_counters(
+        instance.user_id, [instance.author_id], -1
+    )
+    timeline.trim(instance.user_id, instance.author_id)
+    timeline.schedule_fan_in(followers)
+    caching.bump(*follow_scopes(instance))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    caching.bump('edits', 'feed', f'group:{instance.slug}')
+
+
+# Поля, которые показываются в блоке автора на страницах его постов
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, update_fields=None, **kwargs):
+    # При входе сохраняется только last_login: базу не трогаем
+    instance._old_names = None
+    if instance.pk and (
+        update_fields is None or set(update_fields) & set(USER_NAME_FIELDS)
+    ):
+        instance._old_names = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*USER_NAME_FIELDS).first()
+
+
+def renamed_scopes(user, old_username):
+    """Области, где показано имя автора: его страницы, общая лента
+    и группы с его постами, а также записи лент синдикации (edits).
+    В комментариях виден только username."""
+    slugs = (
+        Post.objects.filter(author=user).exclude(group=None).order_by()
+        .values_list('group__slug', flat=True).distinct()
+    )
+    scopes = [
+        'edits', 'feed',
+        # После смены username страницы старого имени тоже устарели
+        f'author:{old_username}', f'author:{user.username}',
+        *(f'group:{slug}' for slug in slugs),
+    ]
+    if old_username != user.username:
+        post_ids = (
+            Comment.objects.filter(author=user).exclude(post=None)
+            .order_by().values_list('post_id', flat=True).distinct()
+        )
+        scopes += (f'comments:{post_id}' for post_id in post_ids)
+    return scopes
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    old = getattr(instance, '_old_names', None)
+    new = tuple(getattr(instance, field) for field in USER_NAME_FIELDS)
+    if created:
+        caching.bump(f'author:{instance.username}')
+    elif old is not None and old != new:
+        caching.bump(*renamed_scopes(instance, old[0]))
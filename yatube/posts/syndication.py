@@ -0,0 +1,123 @@
+"""Ленты Atom, RSS и JSON Feed для всего сайта, групп и авторов.
+
+Готовые записи каждой ленты лежат в кеше. При опросе из базы берутся
+только посты новее самой свежей записи, остальные переиспользуются.
+Правка или удаление поста и правка группы сбрасывают область edits,
+и тогда список записей собирается заново.
+"""
+from django.core.cache import caches
+from django.db.models import Q
+from django.http import Http404, HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed, Rss201rev2Feed
+from django.utils.text import Truncator
+
+from .caching import conditional_response, get_versions
+
+FEED_SIZE = 20
+RECORD_KEY = 'posts:syndication:{}'
+GENERATORS = {
+    'atom': Atom1Feed,
+    'rss': Rss201rev2Feed,
+}
+FORMATS = (*GENERATORS, 'json')
+
+
+def make_entry(post):
+    return {
+        'id': post.pk,
+        'title': Truncator(post.text).words(8),
+        'text': post.text,
+        'author': post.author.get_full_name() or post.author.username,
+        'pub_date': post.pub_date,
+        'url': reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+    }
+
+
+def feed_entries(scope, posts):
+    """Последние FEED_SIZE записей ленты, новые первыми."""
+    cache = caches['pages']
+    key = RECORD_KEY.format(scope)
+    # Версия читается до выборки: правка, случившаяся во время сборки,
+    # сбросит запись при следующем опросе
+    (edits,) = get_versions(['edits'])
+    record = cache.get(key)
+    posts = posts.select_related('author').order_by('-pub_date', '-pk')
+    if record is None or record['edits'] != edits:
+        entries = []
+    else:
+        entries = record['entries']
+    if entries:
+        head = entries[0]
+        posts = posts.filter(
+            Q(pub_date__gte=head['pub_date']),
+            Q(pub_date__gt=head['pub_date']) | Q(pk__gt=head['id']),
+        )
+    new = [make_entry(post) for post in posts[:FEED_SIZE]]
+    if new or not entries:
+        entries = (new + entries)[:FEED_SIZE]
+        cache.set(key, {'edits': edits, 'entries': entries}, timeout=None)
+    return entries
+
+
+def render_feed(request, fmt, title, link, entries):
+    link = request.build_absolute_uri(link)
+    feed_url = request.build_absolute_uri()
+    if fmt == 'json':
+        return JsonResponse({
+            'version': 'https://jsonfeed.org/version/1.1',
+            'title': title,
+            'home_page_url': link,
+            'feed_url': feed_url,
+            'language': 'ru',
+            'items': [
+                {
+                    'id': str(entry['id']),
+                    'url': request.build_absolute_uri(entry['url']),
+                    'title': entry['title'],
+                    'content_text': entry['text'],
+                    'date_published': entry['pub_date'].isoformat(),
+                    'authors': [{'name': entry['author']}],
+                }
+                for entry in entries
+            ],
+        }, content_type='application/feed+json',
+            json_dumps_params={'ensure_ascii': False})
+    feed = GENERATORS[fmt](
+        title=title,
+        link=link,
+        description=title,
+        feed_url=feed_url,
+        language='ru',
+    )
+    for entry in entries:
+        url = request.build_absolute_uri(entry['url'])
+        feed.add_item(
+            title=entry['title'],
+            link=url,
+            description=entry['text'],
+            author_name=entry['author'],
+            pubdate=entry['pub_date'],
+            unique_id=url,
+        )
+    response = HttpResponse(content_type=feed.content_type)
+    feed.write(response, 'utf-8')
+    return response
+
+
+def feed_response(request, fmt, scope, describe):
+    """Лента в формате fmt с ответом 304 для опросов без изменений.
+
+    describe() вызывается, только если ленту нужно отдать, и возвращает
+    заголовок, ссылку на страницу и посты ленты.
+    """
+    if fmt not in FORMATS:
+        raise Http404
+
+    def build():
+        title, link, posts = describe()
+        entries = feed_entries(scope, posts)
+        modified = entries[0]['pub_date'] if entries else None
+        return render_feed(request, fmt, title, link, entries), modified
+
+    return conditional_response(request, [scope], build)
@@ -0,0 +1,60 @@
+import logging
+
+from django import template
+from django.conf import settings
+from django.utils.html import format_html, format_html_join
+
+from ..renditions import build_rendition
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+
+def pending_rendition(image, config):
+    """Миниатюры только запасного формата через sorl, пока фон не нарезал
+    все: srcset есть и у свежего поста, а WebP подождёт.
+
+    Как и тег thumbnail, при ошибке картинку не показывает.
+    """
+    try:
+        return build_rendition(
+            image, {**config, 'formats': config['formats'][-1:]}
+        )
+    except Exception:
+        logger.exception('Не удалось сделать миниатюру %s', image.name)
+        return None
+
+
+@register.simple_tag
+def post_image(post, rendition, css_class=''):
+    """Адаптивная картинка поста из заранее нарезанных миниатюр.
+
+    Браузер сам выбирает формат через <source> и ширину через srcset.
+    Пока фон не успел нарезать миниатюры, они режутся через sorl
+    в одном запасном формате: исходный файл может весить мегабайты.
+    """
+    if not post.image:
+        return ''
+    config = settings.THUMBNAIL_RENDITIONS[rendition]
+    prepared = post.renditions.get(rendition)
+    if not isinstance(prepared, dict):
+        prepared = pending_rendition(post.image, config)
+        if prepared is None:
+            return ''
+    sizes = config['sizes']
+    *sources, (_, fallback_srcset) = prepared['sources'].items()
+    return format_html(
+        '<picture>{}'
+        '<img class="{}" src="{}" srcset="{}" sizes="{}">'
+        '</picture>',
+        format_html_join(
+            '',
+            '<source type="{}" srcset="{}" sizes="{}">',
+            ((mime_type, srcset, sizes) for mime_type, srcset in sources),
+        ),
+        css_class,
+        prepared['src'],
+        fallback_srcset,
+        sizes,
+    )
@@ -0,0 +1,300 @@
+import gc
+import json
+import math
+import os
+import random
+import statistics
+import time
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, TestCase, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+from mixer.backend.django import mixer
+
+from about import urls as about_urls
+from api import urls as api_urls
+from users import urls as users_urls
+
+from .. import search, timeline
+from .. import urls as posts_urls
+from ..counters import rebuild_counters
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Объёмы данных; BUDGET_SCALE=10 даёт десятки тысяч постов
+SCALE = int(os.environ.get('BUDGET_SCALE', 1))
+USERS = 1000 * SCALE
+GROUPS = 20 * SCALE
+POSTS = 3000 * SCALE
+COMMENTS = 3000 * SCALE
+FOLLOWS = 3000 * SCALE
+REPEATS = int(os.environ.get('BUDGET_REPEATS', 20))
+# Время ответа зависит от машины, его бюджеты проверяются только
+# с BUDGET_RUN=1; число запросов к БД проверяется всегда
+TIMINGS = bool(os.environ.get('BUDGET_RUN'))
+# Куда сохранить JSON-отчёт для отслеживания динамики
+REPORT = os.environ.get('BUDGET_REPORT')
+BATCH_SIZE = 500
+# Сколько имён уходит в массовую подписку и отписку
+BULK_USERS = 20
+
+GUEST, READER, AUTHOR = 'guest', 'reader', 'author'
+
+# Имя маршрута: (кто открывает, метод, запросов к БД, p95 в мс).
+# Страницы меряются без кэша, то есть в худшем случае.
+BUDGETS = {
+    'posts:index': (GUEST, 'get', 1, 150),
+    'posts:group_list': (GUEST, 'get', 2, 150),
+    'posts:profile': (GUEST, 'get', 2, 150),
+    'posts:post_detail': (GUEST, 'get', 3, 150),
+    'posts:post_comments': (GUEST, 'get', 1, 100),
+    'posts:post_edit': (AUTHOR, 'get', 5, 100),
+    'posts:post_create': (READER, 'get', 3, 100),
+    'posts:add_comment': (READER, 'post', 7, 100),
+    'posts:follow_index': (READER, 'get', 4, 150),
+    'posts:search': (GUEST, 'get', 2, 150),
+    'posts:site_feed': (GUEST, 'get', 1, 100),
+    'posts:group_feed': (GUEST, 'get', 2, 100),
+    'posts:profile_feed': (GUEST, 'get', 2, 100),
+    'posts:profile_follow': (READER, 'get', 8, 100),
+    'posts:profile_unfollow': (READER, 'get', 8, 100),
+    # Число запросов не зависит от числа имён
+    'posts:follow_bulk': (READER, 'post', 8, 150),
+    'posts:unfollow_bulk': (READER, 'post', 8, 100),
+    'users:logout': (READER, 'get', 4, 100),
+    'users:signup': (GUEST, 'get', 0, 100),
+    'users:login': (GUEST, 'get', 0, 100),
+    'users:password_change': (READER, 'get', 2, 100),
+    'users:password_change_done': (READER, 'get', 2, 100),
+    'users:password_reset_form': (GUEST, 'get', 0, 100),
+    'users:password_reset_confirm': (GUEST, 'get', 1, 100),
+    'users:password_reset_complete': (GUEST, 'get', 0, 100),
+    'users:password_reset_done': (GUEST, 'get', 0, 100),
+    'about:author': (GUEST, 'get', 0, 50),
+    'about:tech': (GUEST, 'get', 0, 50),
+    'api:posts': (GUEST, 'get', 1, 100),
+    'api:post': (GUEST, 'get', 1, 100),
+    'api:comments': (GUEST, 'get', 1, 100),
+    'api:groups': (GUEST, 'get', 1, 100),
+    'api:feed': (READER, 'get', 4, 100),
+    'api:follows': (READER, 'get', 3, 100),
+}
+
+
+def route_names(module):
+    return {
+        f'{module.app_name}:{pattern.name}'
+        for pattern in module.urlpatterns
+        if isinstance(pattern, URLPattern)
+    }
+
+
+def percentile(values, share):
+    # Ранг по ближайшему значению: для 20 замеров p95 - второй с конца
+    values = sorted(values)
+    return values[max(math.ceil(len(values) * share) - 1, 0)]
+
+
+@tag('budget')
+class BudgetTest(TestCase):
+    """Бюджеты запросов и времени ответа на реалистичном объёме данных.
+
+    Отчёт пишется в файл из переменной BUDGET_REPORT.
+    """
+    report = None
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        rng = random.Random(0)
+        with mixer.ctx(commit=False):
+            # SQLite не возвращает id из bulk_create, поэтому строки
+            # перечитываются после каждой вставки.
+            User.objects.bulk_create(
+                mixer.cycle(USERS).blend(
+                    User, username=mixer.sequence('user{0}')
+                ),
+                batch_size=BATCH_SIZE,
+            )
+            users = list(User.objects.only('pk'))
+            Group.objects.bulk_create(
+                mixer.cycle(GROUPS).blend(
+                    Group, slug=mixer.sequence('group-{0}')
+                ),
+                batch_size=BATCH_SIZE,
+            )
+            groups = list(Group.objects.all())
+            Post.objects.bulk_create(
+                (
+                    mixer.blend(
+                        Post,
+                        author=rng.choice(users),
+                        group=rng.choice(groups + [None]),
+                        text=mixer.faker.paragraph(),
+                        image='',
+                        image_renditions='',
+                    )
+                    for _ in range(POSTS)
+                ),
+                batch_size=BATCH_SIZE,
+            )
+            posts = list(Post.objects.only('pk', 'author'))
+            Comment.objects.bulk_create(
+                (
+                    mixer.blend(
+                        Comment,
+                        post=rng.choice(posts),
+                        author=rng.choice(users),
+                        text=mixer.faker.sentence(),
+                    )
+                    for _ in range(COMMENTS)
+                ),
+                batch_size=BATCH_SIZE,
+            )
+        pairs = {
+            tuple(rng.sample(users, 2)) for _ in range(FOLLOWS)
+        }
+        Follow.objects.bulk_create(
+            (Follow(user=user, author=author) for user, author in pairs),
+            batch_size=BATCH_SIZE,
+        )
+        # bulk_create не шлёт сигналов: производные данные строим сами
+        rebuild_counters()
+        for user_id, author_id in Follow.objects.values_list(
+            'user_id', 'author_id'
+        ):
+            timeline.backfill(user_id, author_id)
+        search.rebuild_index()
+
+        cls.users = {
+            READER: Follow.objects.values_list('user', flat=True).first(),
+            AUTHOR: posts[0].author_id,
+        }
+        cls.post = Post.objects.select_related('author').get(
+            pk=posts[0].pk
+        )
+        cls.group = groups[0]
+        cls.reset_user = User.objects.get(pk=cls.users[READER])
+        # Часть авторов у читателя уже в подписках, часть новые
+        followed = list(Follow.objects.filter(
+            user=cls.users[READER]
+        ).values_list('author__username', flat=True))
+        cls.usernames = followed + list(User.objects.exclude(
+            username__in=followed
+        ).values_list('username', flat=True)[:BULK_USERS - len(followed)])
+
+    def route_url(self, name):
+        kwargs = {
+            'posts:group_list': {'slug': self.group.slug},
+            'posts:profile': {'username': self.post.author.username},
+            'posts:post_detail': {'post_id': self.post.pk},
+            'posts:post_comments': {'post_id': self.post.pk},
+            'posts:site_feed': {'fmt': 'atom'},
+            'posts:group_feed': {'slug': self.group.slug, 'fmt': 'rss'},
+            'posts:profile_feed': {
+                'username': self.post.author.username, 'fmt': 'json'
+            },
+            'api:post': {'post_id': self.post.pk},
+            'api:comments': {'post_id': self.post.pk},
+            'posts:post_edit': {'post_id': self.post.pk},
+            'posts:add_comment': {'post_id': self.post.pk},
+            'posts:profile_follow': {'username': self.post.author.username},
+            # Отписка от автора из подписок, а не пустой запрос
+            'posts:profile_unfollow': {'username': self.usernames[0]},
+            'users:password_reset_confirm': {
+                'uidb64': urlsafe_base64_encode(
+                    force_bytes(self.reset_user.pk)
+                ),
+                'token': default_token_generator.make_token(self.reset_user),
+            },
+        }.get(name, {})
+        url = reverse(name, kwargs=kwargs)
+        if name == 'posts:search':
+            url += '?q=' + self.post.text.split()[0]
+        return url
+
+    def route_data(self, name):
+        if name in ('posts:follow_bulk', 'posts:unfollow_bulk'):
+            return {'usernames': self.usernames}
+        return {'text': 'Комментарий'}
+
+    def measure(self, name, viewer, method):
+        url = self.route_url(name)
+        # Мусор от предыдущего маршрута не должен собираться посреди замера
+        gc.collect()
+        timings = []
+        counts = []
+        for _ in range(REPEATS):
+            client = Client()
+            if viewer != GUEST:
+                client.force_login(User.objects.get(pk=self.users[viewer]))
+            cache.clear()
+            request = getattr(client, method)
+            data = self.route_data(name) if method == 'post' else None
+            # Пишущие маршруты откатываются, чтобы повторы шли по тем же данным
+            savepoint = transaction.savepoint()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                response = request(url, data)
+                timings.append((time.perf_counter() - start) * 1000)
+            transaction.savepoint_rollback(savepoint)
+            counts.append(len(queries))
+            self.assertLess(response.status_code, 400, url)
+        return {
+            'url': url,
+            'queries': max(counts),
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'max_ms': round(max(timings), 2),
+        }
+
+    def test_every_route_has_budget(self):
+        routes = set()
+        for module in (posts_urls, users_urls, about_urls, api_urls):
+            routes |= route_names(module)
+        self.assertEqual(routes, set(BUDGETS))
+
+    def measure_routes(self):
+        # Замер общий для обеих проверок бюджетов
+        cls = type(self)
+        if cls.report is not None:
+            return cls.report
+        report = {}
+        for name, (viewer, method, queries, p95_ms) in BUDGETS.items():
+            report[name] = self.measure(name, viewer, method)
+            report[name].update(budget_queries=queries, budget_p95_ms=p95_ms)
+        if REPORT:
+            with open(REPORT, 'w', encoding='utf-8') as file:
+                json.dump({
+                    'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'scale': SCALE,
+                    'repeats': REPEATS,
+                    'routes': report,
+                }, file, ensure_ascii=False, indent=2)
+        cls.report = report
+        return report
+
+    def test_routes_fit_query_budgets(self):
+        for name, result in self.measure_routes().items():
+            with self.subTest(route=name):
+                self.assertLessEqual(
+                    result['queries'], result['budget_queries'],
+                    'Запросов к БД больше бюджета',
+                )
+
+    @skipUnless(TIMINGS, 'Бюджеты времени проверяются с BUDGET_RUN=1')
+    def test_routes_fit_time_budgets(self):
+        for name, result in self.measure_routes().items():
+            with self.subTest(route=name):
+                self.assertLessEqual(
+                    result['p95_ms'], result['budget_p95_ms'],
+                    'p95 времени ответа больше бюджета',
+                )
@@ -0,0 +1,182 @@
+import json
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import follow_graph
+from ..counters import find_inconsistencies
+from ..follows import follow, unfollow
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class FollowsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Reader')
+        cls.other = User.objects.create_user(username='Other')
+        cls.authors = [
+            User.objects.create_user(username=f'Writer{i}') for i in range(3)
+        ]
+        for author in cls.authors:
+            Post.objects.create(author=author, text='Пост')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_follow_is_idempotent(self):
+        author = self.authors[0]
+        self.assertTrue(follow(self.user, author))
+        self.assertFalse(follow(self.user, author))
+        self.authorized_client.get(
+            reverse('posts:profile_follow', kwargs={'username': author})
+        )
+        self.assertEqual(Follow.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(author.stats.followers_count, 1)
+        self.assertEqual(find_inconsistencies(), [])
+
+    def test_duplicate_and_self_follow_rejected_by_database(self):
+        Follow.objects.create(user=self.user, author=self.authors[0])
+        for author in (self.authors[0], self.user):
+            with self.subTest(author=author):
+                with self.assertRaises(IntegrityError), transaction.atomic():
+                    Follow.objects.bulk_create(
+                        [Follow(user=self.user, author=author)]
+                    )
+        self.assertFalse(follow(self.user, self.user))
+
+    def test_unfollow_touches_only_own_follow(self):
+        author = self.authors[0]
+        follow(self.user, author)
+        follow(self.other, author)
+        self.authorized_client.get(
+            reverse('posts:profile_unfollow', kwargs={'username': author})
+        )
+        self.assertFalse(unfollow(self.user, author))
+        self.assertEqual(
+            list(Follow.objects.values_list('user', flat=True)),
+            [self.other.pk],
+        )
+        self.assertEqual(find_inconsistencies(), [])
+
+    def test_bulk_follow_and_unfollow(self):
+        follow(self.user, self.authors[0])
+        usernames = [
+            author.username for author in self.authors
+        ] + ['Reader', 'Nobody']
+        response = self.authorized_client.post(
+            reverse('posts:follow_bulk'),
+            json.dumps({'usernames': usernames}),
+            content_type='application/json',
+        )
+        self.assertEqual(response.json(), {
+            'followed': ['Writer1', 'Writer2'],
+            'unchanged': ['Writer0', 'Reader'],
+            'missing': ['Nobody'],
+        })
+        self.assertEqual(self.user.stats.following_count, 3)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 3
+        )
+        self.assertEqual(find_inconsistencies(), [])
+
+        response = self.authorized_client.post(
+            reverse('posts:unfollow_bulk'),
+            {'usernames': ['Writer0', 'Writer1', 'Other']},
+        )
+        self.assertEqual(response.json(), {
+            'unfollowed': ['Writer0', 'Writer1'],
+            'unchanged': ['Other'],
+            'missing': [],
+        })
+        self.assertEqual(
+            list(Follow.objects.values_list('author', flat=True)),
+            [self.authors[2].pk],
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 1
+        )
+        self.assertEqual(find_inconsistencies(), [])
+
+    def test_bulk_follow_refreshes_cached_profiles(self):
+        url = reverse('posts:profile', kwargs={'username': 'Writer1'})
+        self.assertContains(self.authorized_client.get(url), 'Подписаться')
+        self.authorized_client.post(
+            reverse('posts:follow_bulk'), {'usernames': ['Writer1']}
+        )
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Отписаться')
+        self.assertContains(response, 'Подписчиков: 1')
+
+    def test_bulk_endpoints_validate_input(self):
+        bad_requests = (
+            {},
+            {'usernames': 'Writer0'},
+            {'usernames': ['Writer0'] * 101},
+        )
+        for url in (reverse('posts:follow_bulk'),
+                    reverse('posts:unfollow_bulk')):
+            for data in bad_requests:
+                with self.subTest(url=url, data=data):
+                    response = self.authorized_client.post(
+                        url, json.dumps(data),
+                        content_type='application/json',
+                    )
+                    self.assertEqual(
+                        response.status_code, HTTPStatus.BAD_REQUEST
+                    )
+            with self.subTest(url=url, method='get'):
+                response = self.authorized_client.get(url)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.METHOD_NOT_ALLOWED
+                )
+
+
+class FollowGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Reader')
+        cls.authors = [
+            User.objects.create_user(username=f'Writer{i}') for i in range(5)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        follow_graph.clear_local()
+
+    def test_membership_follows_writes(self):
+        author_ids = [author.pk for author in self.authors]
+        for author in self.authors[3:0:-1]:
+            follow(self.user, author)
+        self.assertEqual(
+            list(follow_graph.following_ids(self.user.pk)),
+            sorted(author_ids[1:4]),
+        )
+        self.assertTrue(follow_graph.is_following(self.user.pk, author_ids[2]))
+        unfollow(self.user, self.authors[2])
+        self.assertFalse(
+            follow_graph.is_following(self.user.pk, author_ids[2])
+        )
+        self.assertEqual(
+            list(follow_graph.following_ids(self.user.pk)),
+            [author_ids[1], author_ids[3]],
+        )
+
+    def test_lookups_skip_database_once_warm(self):
+        follow(self.user, self.authors[0])
+        follow_graph.following_ids(self.user.pk)
+        with self.assertNumQueries(0):
+            follow_graph.is_following(self.user.pk, self.authors[0].pk)
+        # Другой процесс берёт массив из общего кеша
+        follow_graph.clear_local()
+        with self.assertNumQueries(0):
+            follow_graph.is_following(self.user.pk, self.authors[0].pk)
@@ -1,24 +1,53 @@
+import re
 import shutil
+import struct
 import tempfile
+import tracemalloc
+import zlib
 from http import HTTPStatus
+from io import BytesIO
 
 from django.urls import reverse
 from django.test import Client, TestCase, override_settings
-from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadedfile import (
+    SimpleUploadedFile, TemporaryUploadedFile
+)
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.conf import settings
+from PIL import Image
 
 from ..models import Post, Group, Comment
-from ..forms import PostForm
+from ..forms import PostForm, PostImageField
 
 # Создаем временную папку для медиа-файлов;
 # на момент теста медиа папка будет переопределена
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
 User = get_user_model()
 
 
+def png_header(width, height, data_size):
+    """Заголовок PNG с заданными размерами; за ним ждут data_size байт
+    пиксельных данных."""
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + struct.pack('>I', len(ihdr)) + b'IHDR' + ihdr
+        + struct.pack('>I', zlib.crc32(b'IHDR' + ihdr))
+        + struct.pack('>I', data_size) + b'IDAT'
+    )
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostCreateFormTest(TestCase):
     @classmethod
@@ -59,17 +88,9 @@ class PostCreateFormTest(TestCase):
 
     def test_create_post(self):
         post_count = Post.objects.count()
-        small_gif = (
-            b'\x47\x49\x46\x38\x39\x61\x02\x00'
-            b'\x01\x00\x80\x00\x00\x00\x00\x00'
-            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
-            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
-            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
-            b'\x0A\x00\x3B'
-        )
         uploaded = SimpleUploadedFile(
             name='small.gif',
-            content=small_gif,
+            content=SMALL_GIF,
             content_type='image/gif'
         )
         form_data = {
@@ -101,6 +122,71 @@ class PostCreateFormTest(TestCase):
         self.assertEqual(last_post.group.id, form_data['group'])
         self.assertEqual(Post.objects.count(), post_count + 1)
 
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_create_post_generates_renditions(self):
+        uploaded = SimpleUploadedFile(
+            name='renditions.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        rendition = post.renditions['feed']
+        self.assertTrue(
+            rendition['src'].startswith(settings.MEDIA_URL + 'cache/')
+        )
+        self.assertEqual(
+            list(rendition['sources']), ['image/webp', 'image/jpeg']
+        )
+        self.assertTrue(rendition['src'].endswith('.jpg'))
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertContains(response, f'src="{rendition["src"]}"')
+        self.assertContains(
+            response,
+            f'<source type="image/webp" '
+            f'srcset="{rendition["sources"]["image/webp"]}"',
+        )
+
+    def test_post_without_renditions_shows_thumbnails(self):
+        # В TestCase on_commit не срабатывает: нарезка в фоне не начнётся
+        uploaded = SimpleUploadedFile(
+            name='pending.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост без миниатюр', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Пост без миниатюр')
+        self.assertEqual(post.renditions, {})
+        response = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertNotContains(response, f'src="{post.image.url}"')
+        self.assertNotContains(response, '<source')
+        config = settings.THUMBNAIL_RENDITIONS['feed']
+        srcset = re.search(
+            r'<img [^>]*srcset="([^"]+)" sizes="([^"]+)"',
+            response.content.decode(),
+        )
+        self.assertEqual(srcset[2], config['sizes'])
+        candidates = [
+            candidate.split() for candidate in srcset[1].split(', ')
+        ]
+        self.assertEqual(
+            [width for _, width in candidates],
+            [f'{width}w' for width in config['widths']],
+        )
+        for url, _ in candidates:
+            self.assertTrue(url.startswith(settings.MEDIA_URL + 'cache/'))
+            self.assertTrue(url.endswith('.jpg'))
+
     def test_edit_text_in_post(self):
         post_count = Post.objects.count()
         form_data = {
@@ -139,3 +225,79 @@ class PostCreateFormTest(TestCase):
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
         self.assertEqual(post.comments.count(), comments_count + 1)
+
+    def test_huge_image_rejected_before_decoding(self):
+        upload = TemporaryUploadedFile('huge.png', 'image/png', 0, None)
+        data_size = 5 * 1024 * 1024
+        upload.write(png_header(8000, 8000, data_size))
+        upload.write(b'\0' * data_size)
+        upload.size = upload.tell()
+        upload.seek(0)
+        tracemalloc.start()
+        try:
+            form_errors = PostImageField().clean(upload)
+        except Exception as error:
+            form_errors = error
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        upload.close()
+        self.assertIn('Слишком большая картинка', str(form_errors))
+        self.assertLess(peak, 1024 * 1024)
+
+    @override_settings(POST_IMAGE_MAX_SIZE=1024 * 1024)
+    def test_oversized_upload_is_not_saved(self):
+        post_count = Post.objects.count()
+        uploaded = SimpleUploadedFile(
+            name='big.gif',
+            content=SMALL_GIF + b'\0' * 3 * 1024 * 1024,
+            content_type='image/gif'
+        )
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Большая картинка', 'image': uploaded},
+        )
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertTrue(response.context['form'].errors['image'])
+        self.assertEqual(Post.objects.count(), post_count)
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_exif_orientation_is_applied_in_background(self):
+        content = BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        Image.new('RGB', (40, 20)).save(content, 'JPEG', exif=exif)
+        uploaded = SimpleUploadedFile(
+            name='rotated.jpg',
+            content=content.getvalue(),
+            content_type='image/jpeg'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Повёрнутая картинка', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Повёрнутая картинка')
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (20, 40))
+            self.assertFalse(image.getexif())
+        # Исходный файл удалён уже после того, как пост сослался на новый
+        self.assertNotEqual(post.image.name, 'posts/rotated.jpg')
+        self.assertFalse(post.image.storage.exists('posts/rotated.jpg'))
+
+    @override_settings(THUMBNAIL_ASYNC=False)
+    def test_upright_image_is_not_reencoded(self):
+        content = BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 1
+        Image.new('RGB', (40, 20)).save(content, 'JPEG', exif=exif)
+        uploaded = SimpleUploadedFile(
+            name='upright.jpg',
+            content=content.getvalue(),
+            content_type='image/jpeg'
+        )
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Ровная картинка', 'image': uploaded},
+        )
+        post = Post.objects.get(text='Ровная картинка')
+        with post.image.open('rb') as file:
+            self.assertEqual(file.read(), content.getvalue())
@@ -1,7 +1,14 @@
+from io import StringIO
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from ..models import Group, Post
+from ..counters import rebuild_counters
+from ..models import Comment, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -57,3 +64,51 @@ class PostModelTest(TestCase):
                     post._meta.get_field(field).help_text,
                     expected_value
                 )
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+
+    def test_counters_follow_create_and_delete(self):
+        post = Post.objects.create(author=self.user, text='Пост')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Комментарий'
+        )
+        self.user.stats.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(self.user.stats.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.user.stats.refresh_from_db()
+        self.assertEqual(self.user.stats.posts_count, 0)
+
+    def test_rebuild_counters_command(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Пост {i}') for i in range(3)
+        )
+        with self.assertRaises(CommandError):
+            call_command('rebuild_counters', '--check', stdout=StringIO())
+        call_command('rebuild_counters', stdout=StringIO())
+        call_command('rebuild_counters', '--check', stdout=StringIO())
+        self.assertEqual(UserStats.objects.get(user=self.user).posts_count, 3)
+
+    def test_rebuild_counters_does_not_query_per_user(self):
+        def queries(prefix, users):
+            # Разошедшиеся счётчики и пользователи без строки счётчиков
+            UserStats.objects.update(posts_count=7)
+            User.objects.bulk_create(
+                User(username=f'{prefix}{i}') for i in range(users)
+            )
+            with CaptureQueriesContext(connection) as context:
+                rebuild_counters()
+            return len(context)
+
+        rebuild_counters()
+        self.assertEqual(queries('few', 1), queries('many', 10))
+        self.assertEqual(UserStats.objects.get(user=self.user).posts_count, 0)
@@ -0,0 +1,182 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import (
+    Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+
+from .. import partitions
+from ..models import (
+    Comment, Follow, Group, Post, SearchTerm, TimelineEntry,
+)
+
+User = get_user_model()
+
+
+class PartitionMonthsTest(SimpleTestCase):
+    def test_months_cross_year(self):
+        first = datetime(2025, 11, 15, 23, tzinfo=timezone.utc)
+        last = datetime(2026, 2, 1, tzinfo=timezone.utc)
+        self.assertEqual(
+            [partitions.partition_name(start)
+             for start in partitions.months(first, last)],
+            ['posts_post_2025_11', 'posts_post_2025_12',
+             'posts_post_2026_01', 'posts_post_2026_02'],
+        )
+
+
+class PostForeignKeysTest(TestCase):
+    @unittest.skipIf(
+        partitions.is_partitioned(connection),
+        'На секционированную таблицу ключей нет',
+    )
+    def test_keys_to_posts_kept(self):
+        for model in (Comment, TimelineEntry, SearchTerm):
+            with self.subTest(model=model.__name__), connection.cursor() as c:
+                relations = connection.introspection.get_relations(
+                    c, model._meta.db_table
+                )
+                self.assertEqual(
+                    relations[model._meta.get_field('post').column][1],
+                    Post._meta.db_table,
+                )
+
+
+class FeedWindowTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        now = django_timezone.now()
+        # Посты раз в три дня, самый свежий - месяц назад
+        for i in range(25):
+            post = Post.objects.create(author=cls.user, text=f'Пост {i}')
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=now - timedelta(days=30 + 3 * (25 - i))
+            )
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def walk(self):
+        pages = []
+        cursor = None
+        while True:
+            cache.clear()
+            page = self.client.get(
+                reverse('posts:index'), {'cursor': cursor} if cursor else {}
+            ).context['page_obj']
+            pages.append([post.text for post in page])
+            if not page.has_next():
+                return pages
+            cursor = page.next_cursor
+
+    def test_windows_do_not_change_pages(self):
+        expected = self.walk()
+        with override_settings(POST_FEED_WINDOW_DAYS=2):
+            self.assertEqual(self.walk(), expected)
+            second = self.client.get(reverse('posts:index'), {
+                'cursor': self.client.get(
+                    reverse('posts:index')
+                ).context['page_obj'].next_cursor,
+            }).context['page_obj']
+            cache.clear()
+            first = self.client.get(
+                reverse('posts:index'), {'cursor': second.previous_cursor}
+            ).context['page_obj']
+        self.assertEqual([post.text for post in first], expected[0])
+        self.assertEqual(len(expected), 3)
+
+
+class CopySqliteTest(TransactionTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.source = os.path.join(directory.name, 'source.sqlite3')
+        target = os.path.join(directory.name, 'target.sqlite3')
+        user = User.objects.create_user(username='auth')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(
+            title='Группа', slug='group', description='-'
+        )
+        self.post = Post.objects.create(author=user, group=group, text='Пост')
+        Post.objects.filter(pk=self.post.pk).update(
+            pub_date=datetime(2020, 1, 2, tzinfo=timezone.utc)
+        )
+        Comment.objects.create(post=self.post, author=reader, text='Да')
+        Follow.objects.create(user=reader, author=user)
+        with connection.cursor() as cursor:
+            # Обе базы - снимки тестовой: со схемой и этими данными
+            cursor.execute('VACUUM INTO %s', [self.source])
+            cursor.execute('VACUUM INTO %s', [target])
+        connections.databases['copy_target'] = {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': target,
+        }
+        connections.ensure_defaults('copy_target')
+        connections.prepare_test_settings('copy_target')
+        self.addCleanup(connections.databases.pop, 'copy_target')
+        self.addCleanup(connections['copy_target'].close)
+        # Старые данные целевой базы затираются
+        Group.objects.using('copy_target').update(title='Старая')
+
+    def test_copies_rows_as_is(self):
+        out = StringIO()
+        call_command(
+            'copy_sqlite', self.source, database='copy_target',
+            batch_size=1, stdout=out,
+        )
+        self.assertIn('posts.Post: 1', out.getvalue())
+        post = Post.objects.using('copy_target').select_related(
+            'author', 'group'
+        ).get()
+        self.assertEqual(post.pk, self.post.pk)
+        self.assertEqual(
+            post.pub_date, datetime(2020, 1, 2, tzinfo=timezone.utc)
+        )
+        self.assertEqual(post.group.title, 'Группа')
+        self.assertEqual(post.comments.using('copy_target').count(), 1)
+        self.assertEqual(
+            list(Follow.objects.using('copy_target').values_list(
+                'user__username', 'author__username'
+            )),
+            [('reader', 'auth')],
+        )
+        self.assertEqual(
+            User.objects.using('copy_target').get(username='auth').stats
+            .posts_count,
+            User.objects.get(username='auth').stats.posts_count,
+        )
+
+
+@unittest.skipUnless(
+    connection.vendor == 'postgresql', 'Секции есть только в PostgreSQL'
+)
+class PostgresPartitionTest(TestCase):
+    def test_posts_table_is_partitioned(self):
+        self.assertTrue(partitions.is_partitioned(connection))
+        call_command('post_partitions', months=12, stdout=StringIO())
+        future = partitions.add_months(
+            partitions.month_start(django_timezone.now()), 12
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT relname FROM pg_class WHERE relname = %s',
+                [partitions.partition_name(future)],
+            )
+            self.assertIsNotNone(cursor.fetchone())
+            # CHECK на счётчики переехали вместе с таблицей
+            cursor.execute(
+                "SELECT 1 FROM pg_constraint WHERE contype = 'c' "
+                "AND conrelid = %s::regclass", [partitions.TABLE],
+            )
+            self.assertIsNotNone(cursor.fetchone())
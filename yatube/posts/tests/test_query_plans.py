@@ -0,0 +1,84 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Полный просмотр таблицы или сортировка во временном B-дереве
+BAD_PLAN = re.compile(
+    r'^SCAN (?!.*(?:USING (?:COVERING )?INDEX|VIRTUAL TABLE|CONSTANT ROW))'
+    r'|TEMP B-TREE'
+)
+MAIN_TABLE = re.compile(r'FROM "(\w+)"')
+# Служебные таблицы Django ищутся по первичному ключу или уникальному полю.
+# Выдачу поиска (FROM (SELECT ... posts_search)) сортирует по релевантности
+# сам FTS5, по индексу её не упорядочить.
+SKIPPED_TABLES = ('django_session', 'django_content_type', 'auth_')
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+class QueryPlanTest(TestCase):
+    """Запросы лент не должны просматривать таблицы целиком."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='-'
+        )
+        for i in range(12):
+            post = Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}'
+            )
+            Comment.objects.create(
+                post=post, author=cls.user, text=f'Комментарий {i}'
+            )
+        cls.post = post
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def test_views_use_indexes(self):
+        first_page = self.client.get(reverse('posts:index'))
+        cursor = first_page.context['page_obj'].next_cursor
+        cache.clear()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + f'?cursor={cursor}',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+            reverse('posts:search') + '?q=пост',
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                for query in queries:
+                    sql = query['sql']
+                    table = MAIN_TABLE.search(sql)
+                    if (not sql.startswith('SELECT') or table is None
+                            or table.group(1).startswith(SKIPPED_TABLES)):
+                        continue
+                    bad = [
+                        step for step in explain(sql) if BAD_PLAN.search(step)
+                    ]
+                    self.assertFalse(bad, f'{sql}\n{bad}')
@@ -0,0 +1,159 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post
+from ..search import (
+    decode_cursor, encode_cursor, matching_posts, post_ids, rebuild_index,
+    search_page,
+)
+from ..views import COUNT_ELEMS
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.staff = User.objects.create_user(
+            username='admin', is_staff=True, is_superuser=True
+        )
+        cls.strong = Post.objects.create(
+            author=cls.user, text='Ёжик ёжик в тумане'
+        )
+        cls.weak = Post.objects.create(
+            author=cls.user,
+            text='Ежик и лошадка долго гуляли по лесу и пили чай',
+        )
+        cls.other = Post.objects.create(author=cls.user, text='Про котов')
+        Comment.objects.create(
+            post=cls.other, author=cls.user, text='А где туман?'
+        )
+
+    def test_ranked_results(self):
+        for backend in ('auto', 'python'):
+            with self.subTest(backend=backend):
+                with override_settings(SEARCH_BACKEND=backend):
+                    rebuild_index()
+                    self.assertEqual(
+                        post_ids('ЕЖИК'), [self.strong.pk, self.weak.pk]
+                    )
+                    self.assertEqual(
+                        post_ids('ежик туман'), [self.strong.pk]
+                    )
+                    self.assertIn(self.other.pk, post_ids('туман'))
+                    self.assertEqual(post_ids('слон'), [])
+
+    def test_words_match_within_one_document(self):
+        post = Post.objects.create(author=self.user, text='Жираф')
+        Comment.objects.create(post=post, author=self.user, text='Слон')
+        both = Post.objects.create(author=self.user, text='Жираф и слон')
+        for backend in ('auto', 'python'):
+            with self.subTest(backend=backend):
+                with override_settings(SEARCH_BACKEND=backend):
+                    rebuild_index()
+                    self.assertEqual(post_ids('жираф слон'), [both.pk])
+                    self.assertEqual(
+                        list(Post.objects.filter(
+                            pk__in=matching_posts('жираф слон')
+                        )),
+                        [both],
+                    )
+                    self.assertCountEqual(post_ids('слон'), [both.pk, post.pk])
+
+    def test_index_follows_changes(self):
+        for backend in ('auto', 'python'):
+            with self.subTest(backend=backend):
+                with override_settings(SEARCH_BACKEND=backend):
+                    rebuild_index()
+                    post = Post.objects.create(
+                        author=self.user, text='Жираф'
+                    )
+                    self.assertEqual(post_ids('жираф'), [post.pk])
+                    post.text = 'Бегемот'
+                    post.save()
+                    self.assertEqual(post_ids('жираф'), [])
+                    post.delete()
+                    self.assertEqual(post_ids('бегемот'), [])
+
+    def test_search_page_uses_cursor(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Слон номер {i}')
+            for i in range(COUNT_ELEMS + 3)
+        )
+        rebuild_index()
+        client = Client()
+        url = reverse('posts:search')
+        first_page = client.get(url, {'q': 'слон'}).context['page_obj']
+        self.assertEqual(len(first_page), COUNT_ELEMS)
+        second_page = client.get(
+            url, {'q': 'слон', 'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertFalse(set(first_page) & set(second_page))
+        previous_page = client.get(
+            url, {'q': 'слон', 'cursor': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertFalse(previous_page.has_previous())
+
+    def test_cursor_keeps_weights_after_rebuild(self):
+        Post.objects.bulk_create(
+            Post(author=self.user, text=f'Слон номер {i}')
+            for i in range(COUNT_ELEMS + 3)
+        )
+        with override_settings(SEARCH_BACKEND='python'):
+            rebuild_index()
+            first_page = search_page('слон', None, COUNT_ELEMS)
+            # Новые документы меняют idf, а с ним и score всех постов
+            Post.objects.bulk_create(
+                Post(author=self.user, text='Жираф') for _ in range(20)
+            )
+            rebuild_index()
+            second_page = search_page(
+                'слон', first_page.next_cursor, COUNT_ELEMS
+            )
+            self.assertEqual(len(second_page), 3)
+            self.assertFalse(set(first_page) & set(second_page))
+            # Веса читаются одним запросом, а не счётом по индексу
+            with self.assertNumQueries(3):
+                search_page('слон номер', None, COUNT_ELEMS)
+
+    def test_crafted_cursor_starts_over(self):
+        rebuild_index()
+        for cursor in (
+            encode_cursor('n', 1.0, 2 ** 63, None),
+            encode_cursor('n', float('nan'), 1, None),
+            encode_cursor('x', 1.0, 1, None),
+            'bm90IGEgY3Vyc29y',
+        ):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+                self.assertEqual(
+                    list(search_page('ежик', cursor, COUNT_ELEMS)),
+                    [self.strong, self.weak],
+                )
+
+    def test_admin_search_uses_index(self):
+        client = Client()
+        client.force_login(self.staff)
+        for backend in ('auto', 'python'):
+            with self.subTest(backend=backend):
+                with override_settings(SEARCH_BACKEND=backend):
+                    rebuild_index()
+                    response = client.get(
+                        reverse('admin:posts_post_changelist'),
+                        {'q': 'ежик туман'},
+                    )
+                    self.assertEqual(
+                        list(response.context['cl'].result_list),
+                        [self.strong],
+                    )
+                    self.assertEqual(
+                        set(Post.objects.filter(
+                            pk__in=matching_posts('ежик')
+                        )),
+                        {self.strong, self.weak},
+                    )
@@ -0,0 +1,54 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase
+
+from ..counters import find_inconsistencies
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+SEED_ARGS = (
+    '--seed=7', '--batch-size=50', '--image-share=0', '--users=30',
+    '--groups=3', '--posts=200', '--comments=300', '--follows=90',
+)
+
+
+class SeedCommandTest(TestCase):
+    def seed(self, *args):
+        call_command('seed_yatube', *SEED_ARGS, *args, stdout=StringIO())
+
+    def test_creates_consistent_data(self):
+        self.seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertEqual(find_inconsistencies(), [])
+        self.assertFalse(Comment.objects.filter(
+            created__lt=F('post__pub_date')
+        ).exists())
+        # Даты разбросаны по году, а auto_now_add у полей на месте
+        self.assertGreater(
+            Post.objects.dates('pub_date', 'month').count(), 1
+        )
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+        self.assertTrue(Comment._meta.get_field('created').auto_now_add)
+
+    def test_same_seed_gives_same_data(self):
+        self.seed('--no-index')
+        first = list(Post.objects.order_by('pk').values_list(
+            'pk', 'author_id', 'group_id', 'text'
+        ))
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        self.seed('--no-index')
+        second = list(Post.objects.order_by('pk').values_list(
+            'pk', 'author_id', 'group_id', 'text'
+        ))
+        self.assertEqual(first, second)
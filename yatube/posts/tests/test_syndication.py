@@ -0,0 +1,132 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class SyndicationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.user, text=f'Пост {i}', group=cls.group
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def feed_urls(self, fmt):
+        return (
+            reverse('posts:site_feed', kwargs={'fmt': fmt}),
+            reverse('posts:group_feed', kwargs={
+                'slug': self.group.slug, 'fmt': fmt,
+            }),
+            reverse('posts:profile_feed', kwargs={
+                'username': self.user.username, 'fmt': fmt,
+            }),
+        )
+
+    def json_items(self):
+        response = self.guest_client.get(
+            reverse('posts:site_feed', kwargs={'fmt': 'json'})
+        )
+        return [item['content_text'] for item in response.json()['items']]
+
+    def test_formats(self):
+        markers = {
+            'atom': 'xmlns="http://www.w3.org/2005/Atom"',
+            'rss': '<rss',
+            'json': '"version": "https://jsonfeed.org/version/1.1"',
+        }
+        for fmt, marker in markers.items():
+            for url in self.feed_urls(fmt):
+                with self.subTest(url=url):
+                    response = self.guest_client.get(url)
+                    self.assertContains(response, marker)
+                    self.assertContains(response, 'Пост 2')
+
+    def test_unknown_feeds_not_found(self):
+        urls = (
+            reverse('posts:site_feed', kwargs={'fmt': 'xml'}),
+            reverse('posts:group_feed', kwargs={
+                'slug': 'missing', 'fmt': 'atom',
+            }),
+            reverse('posts:profile_feed', kwargs={
+                'username': 'missing', 'fmt': 'atom',
+            }),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_unchanged_feed_is_not_modified(self):
+        url = reverse('posts:site_feed', kwargs={'fmt': 'atom'})
+        response = self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            repeated = self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(repeated.status_code, HTTPStatus.NOT_MODIFIED)
+        repeated = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        )
+        self.assertEqual(repeated.status_code, HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.user, text='Новый пост')
+        repeated = self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(repeated.status_code, HTTPStatus.OK)
+
+    def test_entries_are_appended_incrementally(self):
+        self.assertEqual(self.json_items(), ['Пост 2', 'Пост 1', 'Пост 0'])
+        # Правка в обход сигналов не видна: старые записи берутся из кеша
+        Post.objects.filter(pk=self.posts[0].pk).update(text='Тихая правка')
+        Post.objects.create(author=self.user, text='Новый пост')
+        self.assertEqual(
+            self.json_items(), ['Новый пост', 'Пост 2', 'Пост 1', 'Пост 0']
+        )
+        # Обычная правка перестраивает ленту целиком
+        post = Post.objects.get(pk=self.posts[1].pk)
+        post.text = 'Правка'
+        post.save()
+        self.assertEqual(
+            self.json_items(),
+            ['Новый пост', 'Пост 2', 'Правка', 'Тихая правка'],
+        )
+
+    def test_rename_refreshes_author_in_feeds(self):
+        responses = {
+            url: self.guest_client.get(url) for url in self.feed_urls('json')
+        }
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Новое'
+        user.last_name = 'Имя'
+        user.save()
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                repeated = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(repeated.status_code, HTTPStatus.OK)
+                self.assertEqual(
+                    {item['authors'][0]['name']
+                     for item in repeated.json()['items']},
+                    {'Новое Имя'},
+                )
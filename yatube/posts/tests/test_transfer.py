@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from ..counters import find_inconsistencies
+from ..models import Comment, Follow, Group, Post
+from ..transfer import export_posts, import_posts
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TransferTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='-'
+        )
+        image = default_storage.save(
+            'posts/photo.gif', ContentFile(SMALL_GIF)
+        )
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'Пост {i}',
+                image=image if i == 0 else '',
+            )
+            for i in range(3)
+        ]
+        for post in cls.posts[:2]:
+            Comment.objects.create(
+                post=post, author=cls.reader, text=f'К посту {post.text}'
+            )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def export(self, batch_size=2):
+        stream, images = StringIO(), BytesIO()
+        export_posts(stream, images, batch_size=batch_size)
+        images.seek(0)
+        return stream.getvalue().splitlines(), images
+
+    def test_export_nests_comments_in_posts(self):
+        lines, _ = self.export()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['group', 'post', 'post', 'post', 'follow'],
+        )
+        self.assertEqual(
+            [len(record.get('comments', ())) for record in records],
+            [0, 1, 1, 0, 0],
+        )
+        self.assertEqual(records[1]['comments'][0]['author'], 'reader')
+
+    def test_round_trip_remaps_posts(self):
+        lines, images = self.export()
+        default_storage.delete('posts/photo.gif')
+        lines.append(json.dumps({
+            'type': 'follow', 'user': 'newcomer', 'author': 'auth',
+        }))
+        counts = import_posts(lines, images, batch_size=2)
+        # Подписка reader на auth уже была, новая только у newcomer
+        self.assertEqual(counts, {
+            'group': 0, 'post': 3, 'comment': 2, 'follow': 1, 'image': 1,
+        })
+        self.assertTrue(default_storage.exists('posts/photo.gif'))
+        copies = Post.objects.exclude(
+            pk__in=[post.pk for post in self.posts]
+        ).order_by('pk')
+        self.assertEqual(
+            [(post.text, post.pub_date, post.group_id) for post in copies],
+            [(post.text, post.pub_date, self.group.pk)
+             for post in self.posts],
+        )
+        self.assertEqual(copies[0].image.name, 'posts/photo.gif')
+        # Миниатюры нарезаны сразу, а не при первом показе
+        self.assertIn('feed', copies[0].renditions)
+        self.assertEqual(
+            copies[1].comments.get().text, 'К посту Пост 1'
+        )
+        newcomer = User.objects.get(username='newcomer')
+        self.assertFalse(newcomer.has_usable_password())
+        self.assertEqual(Follow.objects.count(), 2)
+        self.assertEqual(find_inconsistencies(), [])
+
+    def test_commands_and_bad_input(self):
+        directory = tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT)
+        path = os.path.join(directory, 'posts.jsonl')
+        call_command('export_posts', output=path, stderr=StringIO())
+        out = StringIO()
+        call_command('import_posts', path, stdout=out)
+        self.assertIn('post: 3', out.getvalue())
+        self.assertEqual(Post.objects.count(), 6)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('{"type": "post", "text": "Без автора"}\n')
+        with self.assertRaisesMessage(CommandError, 'Строка 1: Нет полей'):
+            call_command('import_posts', path, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 6)
+
+    def test_bad_date_fails_before_images(self):
+        lines, images = self.export()
+        default_storage.delete('posts/photo.gif')
+        # Файлы не откатываются вместе с транзакцией теста
+        self.addCleanup(
+            default_storage.save, 'posts/photo.gif', ContentFile(SMALL_GIF)
+        )
+        record = json.loads(lines[2])
+        record['comments'] = [{
+            'author': 'reader', 'text': 'Когда?', 'created': 'вчера',
+        }]
+        lines[2] = json.dumps(record)
+        with self.assertRaisesMessage(ValueError, 'Строка 3: Неверная дата'):
+            import_posts(lines, images)
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertFalse(default_storage.exists('posts/photo.gif'))
@@ -1,16 +1,23 @@
+import base64
 import shutil
 import tempfile
+from http import HTTPStatus
 
 from django.contrib.auth import get_user_model
-from django.test import Client, TestCase, override_settings
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings,
+)
 from django.urls import reverse
 from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 
 
-from ..models import Post, Group, Follow
-from ..forms import PostForm
+from ..caching import get_versions
+from ..models import Post, Group, Follow, Comment, TimelineEntry
+from ..forms import CommentForm, PostForm
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -186,10 +193,38 @@ class PostPagesTest(TestCase):
 
     def test_cache_for_index_page(self):
         response = self.authorized_client.get(reverse('posts:index'))
+        # update() не шлёт сигналов, поэтому версия кеша не меняется
+        Post.objects.update(text='Изменённый текст')
+        response_cached = self.authorized_client.get(reverse('posts:index'))
+        self.assertEqual(response.content, response_cached.content)
         Post.objects.all().delete()
         response_after_del = self.authorized_client.get(reverse('posts:index'))
-        self.assertEqual(response.content,
-                         response_after_del.content)
+        self.assertNotEqual(response.content, response_after_del.content)
+
+    def test_cache_invalidated_by_related_changes(self):
+        pages = (
+            (reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+             lambda: Post.objects.create(
+                 author=self.author, text='Новый пост', group=self.group)),
+            (reverse('posts:profile', kwargs={'username': self.author}),
+             lambda: Follow.objects.create(
+                 user=self.user, author=self.author)),
+        )
+        for url, change in pages:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                cached = self.authorized_client.get(url)
+                self.assertEqual(response.content, cached.content)
+                change()
+                changed = self.authorized_client.get(url)
+                self.assertNotEqual(response.content, changed.content)
+
+    def test_cache_is_per_user(self):
+        url = reverse('posts:index')
+        response = self.authorized_client.get(url)
+        response_other = self.authorized_other_client.get(url)
+        self.assertContains(response, self.user.username)
+        self.assertContains(response_other, self.other_user.username)
 
     def test_profile_follow_unfollow(self):
         follow_author_before = self.user.follower.filter(
@@ -227,6 +262,28 @@ class PostPagesTest(TestCase):
         self.assertNotEqual(len(response), len(response_other_user))
 
 
+class CacheCommitTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Writer')
+        self.client.force_login(self.user)
+
+    def test_page_cached_before_commit_is_dropped(self):
+        url = reverse('posts:index')
+        with transaction.atomic():
+            post = Post.objects.create(author=self.user, text='До коммита')
+            # Страница успела попасть в кеш, пока транзакция не закрыта
+            self.assertContains(self.client.get(url), 'До коммита')
+            Post.objects.filter(pk=post.pk).update(text='После коммита')
+        self.assertContains(self.client.get(url), 'После коммита')
+
+    def test_unused_parameters_share_cached_page(self):
+        url = reverse('posts:index')
+        self.client.get(url, {'utm_source': 'a'})
+        response = self.client.get(url, {'utm_source': 'b'})
+        self.assertIsNone(response.context)
+
+
 class PaginatorViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -264,14 +321,359 @@ class PaginatorViewsTest(TestCase):
 
     def test_paginator_second_pages(self):
         pages = (
-            (reverse('posts:index'),
-             {'page': '2'}),
-            (reverse('posts:profile', kwargs={'username': self.user}),
-             {'page': '2'}),
-            (reverse('posts:group_list', kwargs={'slug': self.group.slug}),
-             {'page': '2'}),
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
         )
-        for value, args in pages:
+        for value in pages:
             with self.subTest(value=value):
-                response = self.authorized_client.get(value, args)
+                first_page = self.authorized_client.get(value)
+                cursor = first_page.context['page_obj'].next_cursor
+                response = self.authorized_client.get(
+                    value, {'cursor': cursor}
+                )
                 self.assertEqual(len(response.context['page_obj']), 7)
+                self.assertFalse(response.context['page_obj'].has_next())
+
+    def test_paginator_previous_cursor_returns_first_page(self):
+        url = reverse('posts:index')
+        first_page = self.authorized_client.get(url).context['page_obj']
+        second_page = self.authorized_client.get(
+            url, {'cursor': first_page.next_cursor}
+        ).context['page_obj']
+        previous_page = self.authorized_client.get(
+            url, {'cursor': second_page.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(previous_page), list(first_page))
+        self.assertFalse(previous_page.has_previous())
+
+    def test_paginator_invalid_cursor_shows_first_page(self):
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'cursor': 'not-a-cursor'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+    @override_settings(POST_FEED_WINDOW_DAYS=31)
+    def test_paginator_rejects_crafted_cursors(self):
+        cursors = {
+            'oversized pk':
+                'n|2020-01-01T00:00:00+00:00|99999999999999999999|1',
+            'naive date': 'n|2020-01-01T00:00:00|1|2',
+            'far future': 'p|9999-12-31T00:00:00+00:00|1|2',
+        }
+        for name, value in cursors.items():
+            cursor = base64.urlsafe_b64encode(value.encode()).decode()
+            for url in (reverse('posts:index'), reverse('api:posts')):
+                with self.subTest(cursor=name, url=url):
+                    cache.clear()
+                    response = self.authorized_client.get(
+                        url, {'cursor': cursor}
+                    )
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+        # Негодный курсор - это первая страница
+        for name in ('oversized pk', 'naive date'):
+            with self.subTest(cursor=name):
+                cache.clear()
+                cursor = base64.urlsafe_b64encode(
+                    cursors[name].encode()
+                ).decode()
+                page = self.authorized_client.get(
+                    reverse('posts:index'), {'cursor': cursor}
+                ).context['page_obj']
+                self.assertEqual(page.number, 1)
+                self.assertEqual(len(page), 10)
+
+    def test_paginator_does_not_count_rows(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(reverse('posts:index'))
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries)
+        )
+
+
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(
+            title='Заголовок тестовой группы',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        for i in range(10):
+            author = User.objects.create_user(
+                username=f'Author{i}', first_name='Имя', last_name=str(i)
+            )
+            group = Group.objects.create(
+                title=f'Группа {i}', slug=f'group-{i}', description='-'
+            )
+            Post.objects.create(text=f'Пост {i}', author=author, group=group)
+            Post.objects.create(
+                text=f'Пост в группе {i}', author=cls.user, group=cls.group
+            )
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def test_feed_pages_fit_query_budget(self):
+        budgets = (
+            (self.guest_client, reverse('posts:index'), 1),
+            (self.guest_client,
+             reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+             2),
+            (self.guest_client,
+             reverse('posts:profile', kwargs={'username': self.user}),
+             2),
+            (self.authorized_client, reverse('posts:follow_index'), 4),
+        )
+        for client, url, budget in budgets:
+            with self.subTest(url=url):
+                with self.assertNumQueries(budget):
+                    response = client.get(url)
+                self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Writer')
+        cls.old_post = Post.objects.create(author=cls.author, text='Старый')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        cache.clear()
+
+    def get_feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_new_posts_fan_out(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 2
+        )
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+
+    def test_unfollow_trims_timeline(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(self.get_feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_read_on_demand(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, TIMELINE_ASYNC=False)
+    def test_former_celebrity_posts_stay_in_feed(self):
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+        Follow.objects.filter(user=other).delete()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user).count(), 2
+        )
+        cache.clear()
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_former_celebrity_fan_in_leaves_request(self):
+        # Раскладка ждёт коммита, а TestCase его не делает
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новый')
+        other_client = Client()
+        other_client.force_login(other)
+        other_client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username])
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user, post=new_post)
+        )
+        self.assertEqual(
+            User.objects.get(pk=self.author.pk).stats.followers_count, 1
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_cursor_survives_switch_to_celebrity(self):
+        posts = [self.old_post] + [
+            Post.objects.create(author=self.author, text=f'Пост {i}')
+            for i in range(14)
+        ]
+        # Записи ленты получают id не в порядке постов
+        Follow.objects.create(user=self.user, author=self.author)
+        url = reverse('posts:follow_index')
+        first = self.authorized_client.get(url).context['page_obj']
+        other = User.objects.create_user(username='Other')
+        Follow.objects.create(user=other, author=self.author)
+        cache.clear()
+        second = self.authorized_client.get(
+            url, {'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(
+            list(first) + list(second), posts[::-1]
+        )
+
+
+class CommentsPageTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Commenter')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+        cls.comments = [
+            Comment.objects.create(
+                post=cls.post, author=cls.user, text=f'Комментарий {i}'
+            )
+            for i in range(25)
+        ]
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_detail_shows_first_comments_in_order(self):
+        # Пост, счётчики автора и первая страница комментариев
+        with self.assertNumQueries(3):
+            response = self.guest_client.get(
+                reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+            )
+        page = response.context['comments_page']
+        self.assertEqual(list(page), self.comments[:20])
+        self.assertContains(
+            response, reverse(
+                'posts:post_comments', kwargs={'post_id': self.post.pk}
+            )
+        )
+
+    def test_fragment_loads_next_comments(self):
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        first = self.guest_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        ).context['comments_page']
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(
+                url, {'cursor': first.next_cursor}
+            )
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        page = response.context['comments_page']
+        self.assertEqual(list(page), self.comments[20:])
+        self.assertFalse(page.has_next())
+        self.assertNotContains(response, '<html')
+
+    def test_json_comments(self):
+        url = reverse('posts:post_comments', kwargs={'post_id': self.post.pk})
+        data = self.guest_client.get(url, {'format': 'json'}).json()
+        self.assertEqual(len(data['comments']), 20)
+        self.assertEqual(data['comments'][0], {
+            'id': self.comments[0].pk,
+            'author': 'Commenter',
+            'text': 'Комментарий 0',
+            'created': self.comments[0].created.isoformat(),
+        })
+        rest = self.guest_client.get(
+            url, {'format': 'json', 'cursor': data['next_cursor']}
+        ).json()
+        self.assertEqual(len(rest['comments']), 5)
+        self.assertIsNone(rest['next_cursor'])
+
+    def test_rename_refreshes_comments(self):
+        reader = User.objects.create_user(username='Reader')
+        post = Post.objects.create(author=self.user, text='Чужой пост')
+        Comment.objects.create(post=post, author=reader, text='Привет')
+        url = reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        comments_url = reverse(
+            'posts:post_comments', kwargs={'post_id': post.pk}
+        )
+        self.assertContains(self.guest_client.get(url), 'Reader')
+        self.guest_client.get(comments_url, {'format': 'json'})
+        reader.username = 'Renamed'
+        reader.save()
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'Renamed')
+        self.assertNotContains(response, 'Reader')
+        data = self.guest_client.get(comments_url, {'format': 'json'}).json()
+        self.assertEqual(data['comments'][0]['author'], 'Renamed')
+
+    def test_unknown_post_is_404(self):
+        response = self.guest_client.get(
+            reverse('posts:post_comments', kwargs={'post_id': 0})
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class PostDetailFragmentsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='Writer', first_name='Иван', last_name='Петров'
+        )
+        cls.post = Post.objects.create(author=cls.author, text='Тело поста')
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.pk})
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_warm_anonymous_page_needs_one_query(self):
+        self.guest_client.get(self.url)
+        with self.assertNumQueries(1):
+            response = self.guest_client.get(self.url)
+        self.assertContains(response, 'Тело поста')
+        self.assertContains(response, 'Иван Петров')
+
+    def test_form_is_comment_form(self):
+        response = self.guest_client.get(self.url)
+        self.assertIsInstance(response.context['form'], CommentForm)
+
+    def test_fragments_are_invalidated_independently(self):
+        self.guest_client.get(self.url)
+        # update() не шлёт сигналов: тело поста остаётся из кеша
+        Post.objects.filter(pk=self.post.pk).update(text='Без сигнала')
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Свежий комментарий'
+        )
+        response = self.guest_client.get(self.url)
+        self.assertContains(response, 'Тело поста')
+        self.assertContains(response, 'Свежий комментарий')
+
+        Post.objects.create(author=self.author, text='Ещё пост')
+        response = self.guest_client.get(self.url)
+        self.assertContains(response, '<span>2</span>', html=True)
+
+        self.author.first_name = 'Пётр'
+        self.author.save()
+        response = self.guest_client.get(self.url)
+        self.assertContains(response, 'Пётр Петров')
+
+        Post.objects.get(pk=self.post.pk).save()
+        response = self.guest_client.get(self.url)
+        self.assertContains(response, 'Без сигнала')
+
+    def test_only_name_changes_reset_author_scope(self):
+        scopes = ['author:Writer', 'author:Renamed']
+        versions = get_versions(scopes)
+        author = User.objects.get(pk=self.author.pk)
+        self.guest_client.force_login(author)
+        self.assertEqual(get_versions(scopes), versions)
+        author.username = 'Renamed'
+        author.save()
+        old, new = get_versions(scopes)
+        self.assertGreater(old, versions[0])
+        self.assertGreater(new, versions[1])
@@ -0,0 +1,192 @@
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from . import background
+from .models import Follow, Post, TimelineEntry, UserStats
+from .paginator import CursorPaginator
+
+BATCH_SIZE = 500
+
+
+def is_celebrity(author_id):
+    """Посты авторов с огромным числом подписчиков не раскладываются
+    по лентам при записи, а подмешиваются при чтении."""
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).exists()
+
+
+def fan_out_post(post):
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True).distinct()
+    TimelineEntry.objects.bulk_create(
+        (
+            TimelineEntry(
+                user_id=user_id,
+                post_id=post.pk,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in followers.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def _latest_posts(author_ids):
+    """Подзапрос с последними постами каждого из авторов и их номером
+    от нового к старому (position)."""
+    placeholders = ', '.join(['%s'] * len(author_ids))
+    return (
+        f'(SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+        f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+        f') AS position FROM {Post._meta.db_table} '
+        f'WHERE author_id IN ({placeholders})) p'
+    ), list(author_ids)
+
+
+def backfill(user_id, *author_ids):
+    """Докладывает в ленту последние посты авторов, на которых
+    пользователь только что подписался. Популярные авторы пропускаются.
+    """
+    if not author_ids:
+        return
+    posts, params = _latest_posts(author_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, author_id, pub_date) '
+            f'SELECT %s, p.id, p.author_id, p.pub_date FROM {posts} '
+            f'LEFT JOIN {UserStats._meta.db_table} s '
+            f'ON s.user_id = p.author_id '
+            f'WHERE p.position <= %s '
+            f'AND COALESCE(s.followers_count, 0) <= %s '
+            f'ON CONFLICT DO NOTHING',
+            [
+                user_id, *params,
+                settings.TIMELINE_BACKFILL_LIMIT,
+                settings.TIMELINE_FANOUT_LIMIT,
+            ],
+        )
+
+
+def fan_in(*author_ids):
+    """Раскладывает по лентам подписчиков последние посты авторов,
+    которые перестали быть популярными.
+
+    Пока у автора было больше TIMELINE_FANOUT_LIMIT подписчиков, его
+    посты в ленты не попадали, а подписка на него не докладывала их.
+    Теперь лента читается без подмешивания, и их нужно разложить.
+    """
+    if not author_ids:
+        return
+    posts, params = _latest_posts(author_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, author_id, pub_date) '
+            f'SELECT f.user_id, p.id, p.author_id, p.pub_date '
+            f'FROM {Follow._meta.db_table} f '
+            f'JOIN {posts} ON p.author_id = f.author_id '
+            f'WHERE p.position <= %s '
+            f'ORDER BY f.user_id ON CONFLICT DO NOTHING',
+            [*params, settings.TIMELINE_BACKFILL_LIMIT],
+        )
+
+
+def schedule_fan_in(followers):
+    """fan_in для авторов, у которых после отписки подписчиков ровно
+    TIMELINE_FANOUT_LIMIT: они только что перестали быть популярными.
+
+    followers - {id автора: число подписчиков}. Раскладка может
+    вставить до TIMELINE_FANOUT_LIMIT * TIMELINE_BACKFILL_LIMIT строк,
+    поэтому идёт в фоне после коммита; до её конца посты автора
+    в лентах подписчиков не видны.
+    """
+    author_ids = [
+        author_id for author_id, count in followers.items()
+        if count == settings.TIMELINE_FANOUT_LIMIT
+    ]
+    if not author_ids:
+        return
+    if not settings.TIMELINE_ASYNC:
+        fan_in(*author_ids)
+        return
+    background.submit(fan_in, *author_ids)
+
+
+def trim(user_id, *author_ids):
+    TimelineEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+
+
+def rebuild():
+    """Пересобирает все ленты с нуля, например после массовой загрузки
+    данных в обход сигналов.
+
+    Делается одним INSERT ... SELECT: у каждого автора берутся последние
+    TIMELINE_BACKFILL_LIMIT постов, популярные авторы пропускаются.
+    """
+    entries = TimelineEntry._meta.db_table
+    posts = Post._meta.db_table
+    follows = Follow._meta.db_table
+    stats = UserStats._meta.db_table
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {entries} '
+                f'(user_id, post_id, author_id, pub_date) '
+                f'SELECT DISTINCT f.user_id, p.id, p.author_id, p.pub_date '
+                f'FROM {follows} f '
+                f'JOIN (SELECT id, author_id, pub_date, ROW_NUMBER() OVER ('
+                f'PARTITION BY author_id ORDER BY pub_date DESC, id DESC'
+                f') AS position FROM {posts}) p ON p.author_id = f.author_id '
+                f'LEFT JOIN {stats} s ON s.user_id = f.author_id '
+                f'WHERE p.position <= %s '
+                f'AND COALESCE(s.followers_count, 0) <= %s '
+                # Вставка по порядку пользователей идёт в конец индексов
+                # и в разы быстрее вставки вразброс.
+                f'ORDER BY f.user_id',
+                [
+                    settings.TIMELINE_BACKFILL_LIMIT,
+                    settings.TIMELINE_FANOUT_LIMIT,
+                ],
+            )
+
+
+def timeline_page(user, cursor, per_page):
+    """Страница ленты подписок.
+
+    Обычно это просто материализованные записи читателя по индексу
+    (user, -pub_date, -post). Если среди подписок есть популярные
+    авторы, их посты подмешиваются запросом к постам. Курсор в обоих
+    случаях несёт дату и id поста, так что подписка или отписка посреди
+    листания не сдвигает страницы.
+    """
+    celebrities = list(Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).values_list('author_id', flat=True))
+    entries = TimelineEntry.objects.filter(user=user)
+    if celebrities:
+        posts = Post.objects.feed().filter(
+            Q(pk__in=entries.values('post_id'))
+            | Q(author_id__in=celebrities)
+        )
+        return CursorPaginator(
+            posts, per_page, name='timeline'
+        ).get_page(cursor)
+    page = CursorPaginator(
+        entries.select_related('post__author', 'post__group'), per_page,
+        key='post_id', name='timeline',
+    ).get_page(cursor)
+    page.object_list = [entry.post for entry in page.object_list]
+    return page
@@ -0,0 +1,315 @@
+"""Выгрузка и загрузка постов потоком JSONL.
+
+По записи на строку, поле type - group, post, comment или follow.
+Авторы и группы указаны по username и slug, комментарии лежат внутри
+записи своего поста. Поэтому при загрузке не нужно помнить, какой
+новый id получил каждый старый пост, и память не растёт с размером
+выгрузки. Картинки постов пишутся отдельным tar-потоком с путями из
+поля image.
+
+Загрузка, как и seeding, вставляет строки пачками (insert_as_is) с
+заранее посчитанными id и без сигналов, а в конце пересобирает счётчики, ленты
+и поисковый индекс. Параллельно с ней в базу писать не стоит.
+Картинки сохраняются только после коммита строк: сорвавшаяся загрузка
+не оставляет файлов.
+"""
+import json
+import tarfile
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import UNUSABLE_PASSWORD_PREFIX
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import caching, renditions, search, timeline
+from .counters import rebuild_counters
+from .models import Comment, Follow, Group, Post
+from .seeding import insert_as_is, next_pk
+
+User = get_user_model()
+
+IMAGES_PREFIX = 'posts/'
+FIELDS = {
+    'group': ('slug', 'title', 'description'),
+    'post': ('author', 'group', 'text', 'pub_date', 'image', 'comments'),
+    'comment': ('author', 'text', 'created'),
+    'follow': ('user', 'author'),
+}
+# Сколько имён за раз искать в username__in: у SQLite лимит параметров
+LOOKUP_SIZE = 500
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    return iter(lambda: list(islice(iterator, size)), [])
+
+
+def check_fields(kind, record):
+    missing = set(FIELDS[kind]) - record.keys()
+    if missing:
+        raise ValueError(f'Нет полей {", ".join(sorted(missing))}')
+
+
+def parse_date(value):
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'Неверная дата: {value}')
+    return date
+
+
+def write_image(archive, name):
+    try:
+        with default_storage.open(name) as image:
+            info = tarfile.TarInfo(name)
+            info.size = default_storage.size(name)
+            archive.addfile(info, image)
+    except FileNotFoundError:
+        pass
+
+
+def comment_data(author, text, created):
+    return {'author': author, 'text': text, 'created': created.isoformat()}
+
+
+def export_posts(stream, images=None, batch_size=1000):
+    """Пишет всё в stream, картинки - в двоичный поток images.
+
+    Возвращает число выгруженных записей каждого типа.
+    """
+    counts = dict.fromkeys(('group', 'post', 'comment', 'follow'), 0)
+
+    def write(kind, record):
+        record = {'type': kind, **record}
+        stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+        counts[kind] += 1
+
+    archive = images and tarfile.open(fileobj=images, mode='w|')
+    for group in Group.objects.order_by('pk').values(
+        'slug', 'title', 'description'
+    ).iterator(chunk_size=batch_size):
+        write('group', group)
+    posts = Post.objects.order_by('pk').values_list(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date', 'image'
+    )
+    for chunk in chunked(posts.iterator(chunk_size=batch_size), batch_size):
+        # Комментарии пачки одним запросом: диапазон вместо post_id__in,
+        # порядок по посту, как у самой пачки
+        comments = Comment.objects.filter(
+            post__gte=chunk[0][0], post__lte=chunk[-1][0]
+        ).order_by('post_id', 'created', 'pk').values_list(
+            'post_id', 'author__username', 'text', 'created'
+        ).iterator(chunk_size=batch_size)
+        comment = next(comments, None)
+        written = set()
+        for pk, author, group, text, pub_date, image in chunk:
+            own = []
+            while comment is not None and comment[0] == pk:
+                own.append(comment_data(*comment[1:]))
+                comment = next(comments, None)
+            write('post', {
+                'id': pk,
+                'author': author,
+                'group': group,
+                'text': text,
+                'pub_date': pub_date.isoformat(),
+                'image': image,
+                'comments': own,
+            })
+            counts['comment'] += len(own)
+            if archive and image and image not in written:
+                write_image(archive, image)
+                written.add(image)
+    # Комментарии удалённых постов
+    for row in Comment.objects.filter(post__isnull=True).order_by(
+        'pk'
+    ).values_list('author__username', 'text', 'created').iterator(
+        chunk_size=batch_size
+    ):
+        write('comment', comment_data(*row))
+    for user, author in Follow.objects.order_by('pk').values_list(
+        'user__username', 'author__username'
+    ).iterator(chunk_size=batch_size):
+        write('follow', {'user': user, 'author': author})
+    if archive:
+        archive.close()
+    return counts
+
+
+def import_images(images):
+    """Сохраняет картинки из tar-потока; уже лежащие файлы не трогает."""
+    count = 0
+    with tarfile.open(fileobj=images, mode='r|*') as archive:
+        for member in archive:
+            name = member.name
+            if (not member.isfile() or not name.startswith(IMAGES_PREFIX)
+                    or '..' in name.split('/')
+                    or default_storage.exists(name)):
+                continue
+            image = File(archive.extractfile(member), name)
+            image.size = member.size
+            default_storage.save(name, image)
+            count += 1
+    return count
+
+
+class Importer:
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.next_user = next_pk(User)
+        self.next_post = self.first_post = next_pk(Post)
+        # Пары (новый id поста, запись); у комментариев id поста или None
+        self.buffers = {'post': [], 'comment': [], 'follow': []}
+        self.counts = dict.fromkeys(('group', 'post', 'comment', 'follow'), 0)
+
+    def add(self, record):
+        kind = record.get('type')
+        if kind not in FIELDS:
+            raise ValueError(f'Неизвестный тип записи: {kind}')
+        check_fields(kind, record)
+        # Даты разбираются сразу, чтобы ошибка указала на свою строку
+        if kind == 'post':
+            record['pub_date'] = parse_date(record['pub_date'])
+            for comment in record['comments']:
+                check_fields('comment', comment)
+                comment['created'] = parse_date(comment['created'])
+        elif kind == 'comment':
+            record['created'] = parse_date(record['created'])
+        if kind == 'group':
+            if record['slug'] not in self.groups:
+                self.groups[record['slug']] = Group.objects.create(
+                    slug=record['slug'],
+                    title=record['title'],
+                    description=record['description'],
+                ).pk
+                self.counts['group'] += 1
+            return
+        if kind == 'post':
+            post_id = self.next_post
+            self.next_post += 1
+            self.buffers['post'].append((post_id, record))
+            self.buffers['comment'].extend(
+                (post_id, comment) for comment in record['comments']
+            )
+        elif kind == 'comment':
+            self.buffers['comment'].append((None, record))
+        else:
+            self.buffers['follow'].append((None, record))
+        if any(len(buffer) >= self.batch_size
+               for buffer in self.buffers.values()):
+            self.flush()
+
+    def resolve_users(self, usernames):
+        """{username: id}; недостающие пользователи создаются без пароля."""
+        users = {}
+        for names in chunked(sorted(usernames), LOOKUP_SIZE):
+            users.update(User.objects.filter(
+                username__in=names
+            ).values_list('username', 'pk'))
+        missing = []
+        for username in sorted(usernames - users.keys()):
+            users[username] = self.next_user
+            missing.append(User(
+                pk=self.next_user,
+                username=username,
+                password=UNUSABLE_PASSWORD_PREFIX,
+            ))
+            self.next_user += 1
+        User.objects.bulk_create(missing)
+        return users
+
+    def flush(self):
+        posts, comments, follows = (
+            self.buffers['post'], self.buffers['comment'],
+            self.buffers['follow'],
+        )
+        users = self.resolve_users(
+            {record['author'] for _, record in posts + comments + follows}
+            | {record['user'] for _, record in follows}
+        )
+        insert_as_is(Post, (
+            Post(
+                pk=post_id,
+                author_id=users[record['author']],
+                group_id=self.groups.get(record['group']),
+                text=record['text'],
+                pub_date=record['pub_date'],
+                image=record['image'],
+            )
+            for post_id, record in posts
+        ))
+        insert_as_is(Comment, (
+            Comment(
+                post_id=post_id,
+                author_id=users[record['author']],
+                text=record['text'],
+                created=record['created'],
+            )
+            for post_id, record in comments
+        ))
+        self.counts['follow'] += self.insert_follows(sorted({
+            (users[record['user']], users[record['author']])
+            for _, record in follows
+            if record['user'] != record['author']
+        }))
+        self.counts['post'] += len(posts)
+        self.counts['comment'] += len(comments)
+        for buffer in self.buffers.values():
+            buffer.clear()
+
+    def insert_follows(self, pairs):
+        """Вставляет подписки, уже существующие пропускает.
+
+        Возвращает, сколько строк вставлено на самом деле: RETURNING
+        не выдаёт строки, отброшенные уникальным индексом.
+        """
+        inserted = 0
+        with connection.cursor() as cursor:
+            for chunk in chunked(pairs, LOOKUP_SIZE):
+                cursor.execute(
+                    f'INSERT INTO {Follow._meta.db_table} '
+                    f'(user_id, author_id) '
+                    f'VALUES {", ".join(["(%s, %s)"] * len(chunk))} '
+                    f'ON CONFLICT DO NOTHING RETURNING id',
+                    [pk for pair in chunk for pk in pair],
+                )
+                inserted += len(cursor.fetchall())
+        return inserted
+
+
+def import_posts(lines, images=None, batch_size=1000):
+    """Загружает записи из строк JSONL и картинки из tar-потока images.
+
+    Посты получают новые id, авторы и группы сопоставляются по username
+    и slug. Возвращает число загруженных записей каждого типа.
+    """
+    with transaction.atomic():
+        importer = Importer(batch_size)
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                importer.add(json.loads(line))
+            except (ValueError, TypeError, AttributeError) as error:
+                raise ValueError(f'Строка {number}: {error}')
+        importer.flush()
+    # Явные id не двигают последовательности в PostgreSQL
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(
+            no_style(), [User, Post]
+        ):
+            cursor.execute(sql)
+    rebuild_counters()
+    timeline.rebuild()
+    search.rebuild_index()
+    caching.bump('feed')
+    restored = import_images(images) if images else 0
+    # Миниатюры режутся, когда картинки уже на месте
+    renditions.generate_missing(
+        Post.objects.filter(pk__gte=importer.first_post)
+    )
+    return {**importer.counts, 'image': restored}
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку на диск кусками и бросает писать после лимита.
+
+    Размер файла при этом считается полностью, так что форма узнает
+    о превышении и вернёт ошибку, не читая файл.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_SIZE:
+            self.file.too_large = True
+            return None
+        return super().receive_data_chunk(raw_data, start)
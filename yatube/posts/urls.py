@@ -8,12 +8,22 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('feeds/<str:fmt>/', views.site_feed, name='site_feed'),
+    path('group/<slug:slug>/feed/<str:fmt>/', views.group_feed,
+         name='group_feed'),
+    path('profile/<str:username>/feed/<str:fmt>/', views.profile_feed,
+         name='profile_feed'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/comment/', views.add_comment,
          name='add_comment'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('follow/bulk/', views.follow_bulk, name='follow_bulk'),
+    path('unfollow/bulk/', views.unfollow_bulk, name='unfollow_bulk'),
+    path('search/', views.search, name='search'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -1,37 +1,70 @@
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
-
+from django.views.decorators.http import require_POST
 
 from itertools import chain
 
-from .models import Post, Group, User, Comment, Follow
+from core.database import read_replica
+
+from .models import Post, Group, User, Comment
+from . import follows, syndication
+from .caching import fragment_versions, versioned_page
 from .forms import PostForm, CommentForm
+from .paginator import CursorPaginator
+from .renditions import schedule_renditions
+from .search import search_page
+from .timeline import timeline_page
 
 COUNT_ELEMS = 10
+COMMENTS_PER_PAGE = 20
+BULK_FOLLOW_LIMIT = 100
+
+
+def get_page_obj(request, post_list):
+    days = settings.POST_FEED_WINDOW_DAYS
+    paginator = CursorPaginator(
+        post_list, COUNT_ELEMS, window=days and timedelta(days=days)
+    )
+    return paginator.get_page(request.GET.get('cursor'))
 
 
-@cache_page(20)
+def get_comments_page(post_id, cursor=None):
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    )
+    paginator = CursorPaginator(
+        comments, COMMENTS_PER_PAGE, date_field='created', descending=False,
+        name='comments',
+    )
+    return paginator.get_page(cursor)
+
+
+@read_replica
+@versioned_page('feed')
 def index(request):
     template = 'posts/index.html'
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, COUNT_ELEMS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.feed()
+    page_obj = get_page_obj(request, post_list)
     context = {
         'page_obj': page_obj
     }
     return render(request, template, context)
 
 
+@read_replica
+@versioned_page('group:{slug}')
 def group_posts(request, slug):
     template = 'posts/group_list.html'
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, COUNT_ELEMS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.feed()
+    page_obj = get_page_obj(request, post_list)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -39,44 +72,121 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+@read_replica
+@versioned_page('author:{username}', 'follows:{user}')
 def profile(request, username):
     template = 'posts/profile.html'
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, COUNT_ELEMS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    following = False
-    if request.user.is_authenticated:
-        following = author.following.filter(user=request.user)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
+    post_list = author.posts.feed()
+    page_obj = get_page_obj(request, post_list)
     context = {
         'page_obj': page_obj,
         'author': author,
-        'following': following
+        'following': follows.is_following(request.user, author)
     }
     return render(request, template, context)
 
 
+@read_replica
 def post_detail(request, post_id):
+    """Страница поста собирается из фрагментов в кеше: тело поста,
+    блок автора и комментарии сбрасываются независимо друг от друга."""
     template = 'posts/post_detail.html'
-    post = get_object_or_404(Post, pk=post_id)
-    comments = Comment.objects.filter(post_id=post_id)
-    form = PostForm(request.POST or None)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id
+    )
     context = {
         'post': post,
-        'comments': comments,
-        'form': form
+        'versions': fragment_versions(
+            post=f'post:{post_id}',
+            author=f'author:{post.author.username}',
+            group=f'group:{post.group.slug}' if post.group else 'group:',
+            comments=f'comments:{post_id}',
+        ),
+        # Запросы уйдут, только если фрагмента нет в кеше
+        'comments_page': SimpleLazyObject(
+            lambda: get_comments_page(post_id)
+        ),
+        'form': CommentForm(),
     }
     return render(request, template, context)
 
 
+@read_replica
+@versioned_page('comments:{post_id}', params=('cursor', 'format'))
+def post_comments(request, post_id):
+    """Следующие страницы комментариев: HTML-фрагмент или JSON."""
+    comments_page = get_comments_page(post_id, request.GET.get('cursor'))
+    if not comments_page and not Post.objects.filter(pk=post_id).exists():
+        raise Http404
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments_page
+            ],
+            'next_cursor': comments_page.next_cursor,
+        })
+    context = {
+        'post_id': post_id,
+        'comments_page': comments_page,
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
+@read_replica
+def site_feed(request, fmt):
+    return syndication.feed_response(request, fmt, 'feed', lambda: (
+        'Последние обновления на сайте', reverse('posts:index'),
+        Post.objects.all(),
+    ))
+
+
+@read_replica
+def group_feed(request, slug, fmt):
+    def describe():
+        group = get_object_or_404(Group, slug=slug)
+        return (
+            f'Записи сообщества {group.title}',
+            reverse('posts:group_list', kwargs={'slug': slug}),
+            group.posts.all(),
+        )
+
+    return syndication.feed_response(
+        request, fmt, f'group:{slug}', describe
+    )
+
+
+@read_replica
+def profile_feed(request, username, fmt):
+    def describe():
+        author = get_object_or_404(User, username=username)
+        return (
+            f'Все посты пользователя {author.get_full_name() or username}',
+            reverse('posts:profile', kwargs={'username': username}),
+            author.posts.all(),
+        )
+
+    return syndication.feed_response(
+        request, fmt, f'author:{username}', describe
+    )
+
+
 @login_required
 def post_create(request):
     template = 'posts/create_post.html'
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         form.instance.author = request.user
-        form.save()
+        post = form.save()
+        schedule_renditions(post)
         return redirect('posts:profile', request.user)
     context = {
         'form': form,
@@ -97,6 +207,8 @@ def post_edit(request, post_id):
         return redirect('posts:post_detail', post_id=post_id)
     if form.is_valid():
         form.save()
+        if 'image' in form.changed_data:
+            schedule_renditions(post)
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -119,12 +231,13 @@ def add_comment(request, post_id):
 
 
 @login_required
+@read_replica
+@versioned_page('feed', 'follows:{user}')
 def follow_index(request):
     template = 'posts/follow.html'
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, COUNT_ELEMS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = timeline_page(
+        request.user, request.GET.get('cursor'), COUNT_ELEMS
+    )
     context = {
         'page_obj': page_obj,
         'author': 'author',
@@ -135,20 +248,66 @@ def follow_index(request):
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.create(
-        user=request.user,
-        author=author
-    )
+    follows.follow(request.user, author)
     return redirect('posts:profile', username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = User.objects.filter(username=username)
-    follower = Follow.objects.filter(author=author.first())
-    follower.delete()
+    author = get_object_or_404(User, username=username)
+    follows.unfollow(request.user, author)
     return redirect('posts:profile', username)
 
 
+def get_usernames(request):
+    """Имена из JSON {"usernames": [...]} или из полей формы usernames."""
+    if request.content_type == 'application/json':
+        try:
+            usernames = json.loads(request.body).get('usernames')
+        except (ValueError, AttributeError):
+            return None
+    else:
+        usernames = request.POST.getlist('usernames')
+    if (
+        not isinstance(usernames, list)
+        or not 0 < len(usernames) <= BULK_FOLLOW_LIMIT
+        or not all(isinstance(name, str) for name in usernames)
+    ):
+        return None
+    return usernames
 
 
+@require_POST
+@login_required
+def follow_bulk(request):
+    usernames = get_usernames(request)
+    if usernames is None:
+        return JsonResponse(
+            {'error': f'Нужно от 1 до {BULK_FOLLOW_LIMIT} имён в usernames'},
+            status=400,
+        )
+    return JsonResponse(follows.follow_many(request.user, usernames))
+
+
+@require_POST
+@login_required
+def unfollow_bulk(request):
+    usernames = get_usernames(request)
+    if usernames is None:
+        return JsonResponse(
+            {'error': f'Нужно от 1 до {BULK_FOLLOW_LIMIT} имён в usernames'},
+            status=400,
+        )
+    return JsonResponse(follows.unfollow_many(request.user, usernames))
+
+
+@read_replica
+def search(request):
+    template = 'posts/search.html'
+    query = request.GET.get('q', '').strip()
+    page_obj = search_page(query, request.GET.get('cursor'), COUNT_ELEMS)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
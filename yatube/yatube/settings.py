@@ -11,6 +11,9 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -44,10 +47,13 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.profiling.ProfilingMiddleware',
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,7 +68,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.profiling.ProfiledDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -84,11 +90,49 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 Django с пулом соединений, см. core/pool.py;
+        # для PostgreSQL есть core.backends.postgresql
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Сколько секунд ждать, пока база занята другим писателем
+        'OPTIONS': {'timeout': 20},
+        # В конце запроса соединение возвращается в пул
+        'CONN_MAX_AGE': 0,
+        'POOL': {
+            'SIZE': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'TIMEOUT': 10,
+            'MAX_LIFETIME': int(os.environ.get('DB_POOL_MAX_LIFETIME', 600)),
+            'CHECK_INTERVAL': 30,
+        },
     }
 }
 
+# PRAGMA для каждого нового соединения с SQLite, см. core/database.py
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    # В режиме WAL normal не теряет целостность, а fsync реже
+    'synchronous': 'normal',
+    'busy_timeout': 20000,
+    # Отрицательное значение - в КиБ: 64 МБ кеша страниц
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
+
+# SQLITE_REPLICA=1: ленты читаются через отдельное соединение только
+# для чтения к тому же файлу. В режиме WAL оно видит каждую
+# завершённую запись, поэтому страница, закешированная под новой
+# версией области, не бывает старой. Копию базы, которая отстаёт,
+# сюда подключать нельзя. Тесты гоняются без реплики.
+DATABASE_READ_REPLICA = None
+if os.environ.get('SQLITE_REPLICA'):
+    DATABASE_READ_REPLICA = 'replica'
+    DATABASES[DATABASE_READ_REPLICA] = {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.database.ReadReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -139,8 +183,135 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Бэкенд кеша выбирается переменной окружения CACHE_BACKEND:
+# locmem - свой кеш в каждом процессе (разработка и тесты),
+# file - общий кеш на диске для всех воркеров,
+# db - общий кеш в таблице SQLite (нужен manage.py createcachetable),
+# redis - общий кеш в Redis (нужен пакет django-redis).
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+if CACHE_BACKEND == 'redis':
+    try:
+        import django_redis  # noqa: F401
+    except ImportError:
+        raise ImproperlyConfigured(
+            'CACHE_BACKEND=redis: установите пакет django-redis'
+        )
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1')
+
+# Алиасы кеша и время жизни записей в них по умолчанию
+CACHE_ALIASES = {
+    'default': 300,
+    'pages': 300,
+    'template_fragments': 300,
+    'thumbnails': None,
+    'sessions': 60 * 60 * 24 * 14,
+    'follow_graph': 60 * 60 * 24,
+}
+
+
+def cache_config(alias, timeout):
+    config = {
+        'KEY_PREFIX': alias,
+        'TIMEOUT': timeout,
     }
-}
\ No newline at end of file
+    if CACHE_BACKEND == 'file':
+        config['BACKEND'] = 'core.cache.StatsFileBasedCache'
+        config['LOCATION'] = os.path.join(CACHE_DIR, alias)
+    elif CACHE_BACKEND == 'db':
+        config['BACKEND'] = 'core.cache.StatsDatabaseCache'
+        config['LOCATION'] = f'cache_{alias}'
+    elif CACHE_BACKEND == 'redis':
+        config['BACKEND'] = 'core.cache.StatsRedisCache'
+        config['LOCATION'] = REDIS_URL
+    else:
+        # Общее хранилище, чтобы cache.clear() сбрасывал все алиасы
+        config['BACKEND'] = 'core.cache.StatsLocMemCache'
+        config['LOCATION'] = 'yatube'
+    return config
+
+
+CACHES = {
+    alias: cache_config(alias, timeout)
+    for alias, timeout in CACHE_ALIASES.items()
+}
+
+THUMBNAIL_CACHE = 'thumbnails'
+
+# Загрузки крупнее FILE_UPLOAD_MAX_MEMORY_SIZE пишутся на диск кусками,
+# а после POST_IMAGE_MAX_SIZE запись прекращается
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'posts.uploadhandlers.LimitedTemporaryFileUploadHandler',
+]
+POST_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40_000_000
+
+# Потоков в фоновом пуле posts/background.py
+BACKGROUND_WORKERS = 2
+# Миниатюры картинок постов нарезаются в фоне после сохранения поста
+THUMBNAIL_ASYNC = True
+# Для каждой миниатюры режутся все ширины во всех форматах; последний
+# формат - запасной для браузеров без поддержки остальных
+THUMBNAIL_RENDITIONS = {
+    'feed': {
+        'geometry': '960x339',
+        'widths': (480, 960, 1440),
+        'formats': ('WEBP', 'JPEG'),
+        'sizes': '(max-width: 992px) 100vw, 960px',
+        'crop': 'center',
+        'upscale': True,
+    },
+}
+
+if CACHE_BACKEND != 'locmem':
+    # Сессии в общем кеше, с записью в базу на случай вытеснения
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    SESSION_CACHE_ALIAS = 'sessions'
+
+# Лента подписок: посты авторов, у которых подписчиков больше лимита,
+# не раскладываются по лентам, а читаются напрямую
+TIMELINE_FANOUT_LIMIT = 1000
+# Сколько последних постов автора добавить в ленту при подписке
+TIMELINE_BACKFILL_LIMIT = 1000
+# Посты автора, переставшего быть популярным, раскладываются в фоне
+TIMELINE_ASYNC = True
+# Для скольких читателей список подписок держится в памяти процесса
+FOLLOW_GRAPH_LOCAL_SIZE = 10000
+# Ленты читаются окнами по pub_date такой ширины в днях, чтобы запросы
+# к секционированной таблице постов трогали только нужные секции.
+# None - без окон, см. settings_postgres.py
+POST_FEED_WINDOW_DAYS = None
+
+# Поиск: auto - FTS5, если SQLite его поддерживает, иначе индекс на Python
+SEARCH_BACKEND = 'auto'
+
+# Доля запросов, для которых снимается профиль; 0 - профилирование выключено
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.01))
+# Как часто сводка профилей пишется в лог, в секундах
+PROFILING_LOG_INTERVAL = 300
+
+# Файлы счётчиков /metrics, по файлу на поток каждого воркера.
+# Файлы завершившихся воркеров сбор сводит в один архивный.
+METRICS_DIR = os.environ.get(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'yatube-metrics')
+)
+# Сборщик метрик передаёт Authorization: Bearer <METRICS_TOKEN>
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+# Адреса, которым /metrics открыт без токена. Только если приложение
+# стоит без прокси: за ним все запросы приходят с 127.0.0.1
+METRICS_ALLOWED_IPS = []
+# Тесты пишут метрики во временный каталог
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.profiling': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
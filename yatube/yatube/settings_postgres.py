@@ -0,0 +1,45 @@
+"""Профиль для PostgreSQL 11+: DJANGO_SETTINGS_MODULE=yatube.settings_postgres.
+
+Нужен psycopg2 ниже 2.9, с ним работает Django 2.2:
+pip install 'psycopg2-binary<2.9'. Посты лежат в таблице,
+секционированной по месяцам pub_date (posts/partitions.py), данные
+из SQLite переносит manage.py copy_sqlite.
+"""
+import os
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES as SQLITE_DATABASES
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'core.backends.postgresql',
+        'NAME': os.environ.get('POSTGRES_DB', 'yatube'),
+        'USER': os.environ.get('POSTGRES_USER', 'yatube'),
+        'PASSWORD': os.environ.get('POSTGRES_PASSWORD', ''),
+        'HOST': os.environ.get('POSTGRES_HOST', '127.0.0.1'),
+        'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        'CONN_MAX_AGE': 0,
+        'POOL': SQLITE_DATABASES['default']['POOL'],
+    }
+}
+
+# Реплика - горячий резерв, он и так только для чтения. Он должен быть
+# в synchronous_standby_names на основном сервере: с remote_apply
+# COMMIT возвращается, только когда резерв применил запись, и версия
+# области кеша не обгоняет данные на реплике.
+POSTGRES_REPLICA_HOST = os.environ.get('POSTGRES_REPLICA_HOST')
+DATABASE_READ_REPLICA = None
+if POSTGRES_REPLICA_HOST:
+    DATABASE_READ_REPLICA = 'replica'
+    DATABASES['default']['OPTIONS'] = {
+        'options': '-c synchronous_commit=remote_apply',
+    }
+    DATABASES[DATABASE_READ_REPLICA] = {
+        **DATABASES['default'],
+        'HOST': POSTGRES_REPLICA_HOST,
+        'OPTIONS': {},
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Месячные секции: первая страница ленты обычно укладывается в одну
+POST_FEED_WINDOW_DAYS = 31
@@ -3,13 +3,19 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from core.views import cache_stats_view, metrics_view, profile_stats_view
+
 handler404 = 'core.views.page_not_found'
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('stats/cache/', cache_stats_view, name='cache_stats'),
+    path('stats/profile/', profile_stats_view, name='profile_stats'),
+    path('metrics', metrics_view, name='metrics'),
     path('auth/', include('users.urls', namespace='users')),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('api/', include('api.urls', namespace='api')),
     path('', include('posts.urls', namespace='posts')),
 ]
 